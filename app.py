@@ -1,10 +1,19 @@
 import streamlit as st
-import fitz  # PyMuPDF
 import pandas as pd
 from streamlit_pdf_viewer import pdf_viewer
-import processor
+import overlay
+import perf
+import pipeline
+from cache import ResultCache, cache_key
+from jobs import DEFAULT_JOB_WORKERS, DONE, QUEUED, JobManager, JobQueueFull
+from preview import DEFAULT_PREVIEW_DPI, PageRenderCache
+from processor import SPOOL_THRESHOLD, spool_pdf
 from utils import DEFAULT_KEYWORDS, CATEGORY_COLORS, get_flattened_keywords
-import re
+import functools
+import html
+import os
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
 
 st.set_page_config(page_title="SkimMate", layout="wide", initial_sidebar_state="collapsed")
 
@@ -19,6 +28,185 @@ if 'page' not in st.session_state:
 if 'processed' not in st.session_state:
     st.session_state['processed'] = False
 
+perf.configure_logging()
+
+@st.cache_resource
+def get_result_cache():
+    # One cache per server process, shared by every session
+    return ResultCache()
+
+@st.cache_resource
+def get_page_render_cache():
+    # Rendered preview pages, shared by every session
+    return PageRenderCache()
+
+@st.cache_resource
+def get_job_manager():
+    # Analyses run on a bounded pool shared by every session; sessions poll their job
+    return JobManager(cache=get_result_cache())
+
+@st.cache_resource
+def get_highlight_executor():
+    # Highlighted PDFs are generated in the background on a pool as large as the analysis pool
+    return ThreadPoolExecutor(max_workers=DEFAULT_JOB_WORKERS, thread_name_prefix="skimmate-highlight")
+
+# Triage deck cards: category -> (title, emoji)
+TRIAGE_CARDS = {
+    "research_gap": ("The Gap", "🎯"),
+    "dataset_used": ("Data Source", "📊"),
+    "main_conclusion": ("The Verdict", "💡"),
+}
+
+# Progressive analysis view
+JOB_POLL_INTERVAL = 0.5  # seconds between progress redraws while the paper is analyzed
+JOB_RETRY_INTERVAL = 3.0  # seconds before resubmitting when the analysis queue is full
+PREVIEW_PAGE_SIZE = 50  # sentences per page of the sentence preview
+HIGHLIGHT_POLL_INTERVAL = 1.0  # seconds between checks for the highlighted PDF
+
+# Page-image preview of the PDF
+PREVIEW_VISIBLE_PAGES = 3
+PREVIEW_DPI_OPTIONS = sorted({48, 72, 96, 144, DEFAULT_PREVIEW_DPI})
+SEARCH_RESULTS = 20  # hits shown for a search in the paper
+CITATION_TEXT_CHARS = 120  # characters of each reference shown in the citations sidebar
+# Analysis result entries kept in the session (and passed back for incremental updates)
+RESULT_FIELDS = ('stats', 'keyword_counts', 'keyword_forms', 'context_data', 'triage_data', 'citations', 'search_index')
+
+def get_highlight_job():
+    """Starts highlighting the current paper in the background (once per paper) and returns the future."""
+    job = st.session_state.get('highlight_job')
+    if job is None:
+        job = get_highlight_executor().submit(
+            pipeline.highlight_document, st.session_state['pdf_source'], st.session_state['keyword_map'], CATEGORY_COLORS,
+            cache=get_result_cache(), pdf_hash=st.session_state['pdf_hash'],
+        )
+        st.session_state['highlight_job'] = job
+    return job
+
+def export_highlight_overlay(pdf_source, keyword_map, pdf_hash, overlay_format):
+    # Computed on download only (possibly outside the script run, so nothing
+    # is read from the session here); cached with the analysis results
+    highlight_overlay = pipeline.overlay_document(pdf_source, keyword_map, CATEGORY_COLORS, cache=get_result_cache(), pdf_hash=pdf_hash)
+    return overlay.to_xfdf(highlight_overlay) if overlay_format == "xfdf" else overlay.to_json(highlight_overlay)
+
+def forget_highlight_job():
+    # Cancels this session's highlighting if it has not started, so the
+    # shared pool does not work on PDFs nobody will look at
+    job = st.session_state.pop('highlight_job', None)
+    if job is not None:
+        job.cancel()
+
+def highlight_error(job):
+    """Returns the exception of a finished highlight job, or None while it runs or once it succeeded."""
+    if not job.done():
+        return None
+    if job.cancelled():
+        return CancelledError()
+    return job.exception()
+
+def load_highlighted_pdf(job, pdf_source, keyword_map, pdf_hash):
+    # Only called when the download is clicked. Bytes for papers kept in
+    # memory; spooled ones are handed to Streamlit as the open file, which
+    # it reads itself, instead of being copied into bytes here first.
+    # A failed or cancelled background job is retried here, for this download.
+    try:
+        highlighted_pdf = job.result()
+    except (CancelledError, Exception):
+        highlighted_pdf = pipeline.highlight_document(pdf_source, keyword_map, CATEGORY_COLORS, cache=get_result_cache(), pdf_hash=pdf_hash)
+    if isinstance(highlighted_pdf, str):
+        return open(highlighted_pdf, "rb")
+    return highlighted_pdf
+
+def forget_analysis_job():
+    # Lets the job manager drop (or, if still queued, cancel) this session's analysis
+    job_id = st.session_state.pop('analysis_job', None)
+    job = get_job_manager().get(job_id) if job_id is not None else None
+    if job is not None:
+        get_job_manager().release(job)
+    st.session_state.pop('pending_source', None)
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def watch_analysis(job):
+    # Progressive view: stat cards and sentences grow as the worker analyzes pages
+    if job.done():
+        st.rerun()
+    snapshot = job.snapshot()
+    if snapshot['status'] == QUEUED:
+        ahead = get_job_manager().position(job)
+        st.progress(0.0, text=f"Waiting for a free worker ({ahead} {'paper' if ahead == 1 else 'papers'} ahead)...")
+        return
+    if snapshot['page_count']:
+        st.progress(snapshot['page'] / snapshot['page_count'], text=f"Analyzing page {snapshot['page']} of {snapshot['page_count']}...")
+    else:
+        st.progress(0.0, text="Opening paper...")
+    render_live_stats(st.empty(), snapshot['stats'])
+    recent = [f"p.{page} · <b>{html.escape(keyword)}</b> — {snippet}" for page, keyword, snippet in snapshot['recent']]
+    st.markdown("<br>".join(reversed(recent)), unsafe_allow_html=True)
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def wait_for_queue_slot(queued):
+    # Backpressure: the queue is full, so the paper is resubmitted after a pause
+    if time.monotonic() >= st.session_state.get('queue_retry_at', 0):
+        st.rerun()
+    st.warning(f"SkimMate is busy: {queued} papers are waiting for analysis. Yours will be queued as soon as there is room.")
+
+def release_spooled_pdf():
+    # Removes the temp file of a paper spooled to disk, if any
+    spooled_path = st.session_state.pop('spooled_path', None)
+    if spooled_path is not None:
+        try:
+            os.remove(spooled_path)
+        except OSError:
+            pass
+
+@st.fragment(run_every=HIGHLIGHT_POLL_INTERVAL)
+def wait_for_highlighting(job):
+    # Polls the background job and reruns the page once the PDF is ready
+    if job.done():
+        st.rerun()
+    st.info("Highlighting the PDF in the background...")
+
+def apply_category_selection():
+    # Toggling a category rematches only the sentences it affects (see pipeline.reanalyze)
+    selected = st.session_state.get('selected_categories') or []
+    custom_keywords = [k.strip() for k in st.session_state['custom_input'].split(",") if k.strip()]
+    keyword_map = get_flattened_keywords([c for c in DEFAULT_KEYWORDS if c in selected], custom_keywords)
+    previous_map = st.session_state['keyword_map']
+    if keyword_map == previous_map:
+        return
+    pdf_source, pdf_hash = st.session_state['pdf_source'], st.session_state['pdf_hash']
+    result = {name: st.session_state[name] for name in RESULT_FIELDS}
+    result['highlighted_pdf'] = None
+    result = pipeline.reanalyze(pdf_source, result, previous_map, keyword_map, cache=get_result_cache(), pdf_hash=pdf_hash)
+    for name in RESULT_FIELDS:
+        st.session_state[name] = result[name]
+    st.session_state['keyword_map'] = keyword_map
+    st.session_state['doc_key'] = cache_key(pdf_source, keyword_map, pdf_hash=pdf_hash)
+    # The highlighted PDF is updated in the background for the new keywords
+    forget_highlight_job()
+
+def reset_preview_page():
+    st.session_state['preview_page'] = 1
+
+def jump_to_page(key='jump_page'):
+    # Shows the page picked in the sentence preview (or search results) in the PDF preview
+    page = st.session_state.get(key)
+    if page is not None:
+        st.session_state['pdf_preview_page'] = page
+
+def render_live_stats(placeholder, stats):
+    cards = "".join(
+        f"<div class='card stat-card {color_class}' style='flex: 1; margin-bottom: 0;'>"
+        f"<div class='stat-card-header'><div class='stat-title'>{category}</div>"
+        f"<div class='stat-count'>{stats.get(category, 0)}</div></div></div>"
+        for category, color_class in [
+            ("Errors/Mistakes", "border-red"),
+            ("Novelty/Contribution", "border-green"),
+            ("Methodology", "border-blue"),
+            ("Analysis/Results", "border-purple"),
+        ]
+    )
+    placeholder.markdown(f"<div style='display: flex; gap: 12px; margin-bottom: 1rem;'>{cards}</div>", unsafe_allow_html=True)
+
 def local_css():
     st.markdown("""
     <style>
@@ -205,6 +393,13 @@ def local_css():
             justify-content: space-between;
             margin-bottom: 3px;
         }
+        .snippet-match {
+            background-color: rgba(255, 255, 0, 0.2);
+            color: #FFD700;
+            font-weight: bold;
+            padding: 0 4px;
+            border-radius: 4px;
+        }
         
         /* Buttons */
         .stButton button {
@@ -277,6 +472,7 @@ if st.session_state['page'] == 'landing':
             if uploaded_file:
                 if st.button("Analyze Paper", type="primary", use_container_width=True):
                     st.session_state['uploaded_file'] = uploaded_file
+                    forget_analysis_job()
                     st.session_state['custom_input'] = custom_input
                     st.session_state['page'] = 'dashboard'
                     st.rerun()
@@ -321,49 +517,89 @@ if st.session_state['page'] == 'landing':
 
 # --- Dashboard Page ---
 elif st.session_state['page'] == 'dashboard':
-    uploaded_file = st.session_state['uploaded_file']
+    uploaded_file = st.session_state.get('uploaded_file')
     custom_input = st.session_state['custom_input']
     
     # Process if not already processed
     if not st.session_state['processed']:
-        with st.spinner("Analyzing and Highlighting..."):
+        # The analysis runs on the server-wide job pool; this script run only
+        # submits it and then polls, so it never holds a thread for the whole job
+        manager = get_job_manager()
+        job_id = st.session_state.get('analysis_job')
+        job = manager.get(job_id) if job_id is not None else None
+        
+        if job is None:
             # Prepare keywords
             custom_keywords = [k.strip() for k in custom_input.split(",") if k.strip()]
-            # Select all categories by default for now
+            # Every category is analyzed; the dashboard narrows them down incrementally
             selected_categories = list(DEFAULT_KEYWORDS.keys())
             keyword_map = get_flattened_keywords(selected_categories, custom_keywords)
             
-            # Analysis
-            stats, keyword_counts, context_data = processor.extract_sentences_with_keywords(uploaded_file, keyword_map)
-            
-            # Phase 2: AI Triage & Citations
-            # We need raw text for these. Since we already read the stream in processor, we might need to re-read or adjust.
-            # However, processor.extract_sentences_with_keywords reads it. 
-            # Let's just re-read here for simplicity or better yet, let's extract text once.
-            # For now, we'll just re-open in processor functions as they handle seek(0).
-            
-            # Get full text for triage/citations (simplified extraction)
-            doc = fitz.open(stream=uploaded_file.read(), filetype="pdf")
-            full_text = ""
-            for page in doc:
-                full_text += page.get_text()
-            uploaded_file.seek(0) # Reset
+            # Large uploads are spooled to disk and analyzed file-backed, so
+            # neither the paper nor its highlighted copy stays in memory.
+            # Kept across retries while the queue is full.
+            if 'pending_source' not in st.session_state:
+                release_spooled_pdf()
+                upload_size = uploaded_file.seek(0, os.SEEK_END)
+                uploaded_file.seek(0)
+                if upload_size > SPOOL_THRESHOLD:
+                    st.session_state['spooled_path'] = spool_pdf(uploaded_file)
+                    st.session_state['pending_source'] = st.session_state['spooled_path']
+                else:
+                    st.session_state['pending_source'] = uploaded_file.getvalue()
+            pdf_source = st.session_state['pending_source']
             
-            triage_data = processor.generate_paper_triage(full_text)
-            citations = processor.extract_citations(full_text)
-
-            # Highlighting
-            highlighted_pdf_bytes = processor.highlight_pdf(uploaded_file, keyword_map, CATEGORY_COLORS)
+            # Stage timings, only collected when enabled in the performance panel
+            recorder = None
+            if st.session_state.get('perf_enabled', perf.ENABLED):
+                recorder = perf.PerfRecorder(document_id=getattr(uploaded_file, 'name', None))
             
-            st.session_state['stats'] = stats
-            st.session_state['keyword_counts'] = keyword_counts
-            st.session_state['context_data'] = context_data
-            st.session_state['triage_data'] = triage_data
-            st.session_state['citations'] = citations
-            st.session_state['highlighted_pdf'] = highlighted_pdf_bytes
-            st.session_state['processed'] = True
-            st.rerun()
+            # Analysis, triage and citations (cached by PDF + keyword hash)
+            try:
+                job = manager.submit(pdf_source, keyword_map, CATEGORY_COLORS, recorder=recorder)
+            except JobQueueFull as e:
+                st.session_state['queue_retry_at'] = time.monotonic() + JOB_RETRY_INTERVAL
+                wait_for_queue_slot(e.queued)
+                st.stop()
+            st.session_state['analysis_job'] = job.id
+            st.session_state['keyword_map'] = keyword_map
+        
+        if not job.done():
+            watch_analysis(job)
+            st.stop()
+        
+        if job.status != DONE:
+            st.error(f"The analysis failed: {job.error or job.status}")
+            if st.button("↺ Upload New Paper"):
+                st.session_state['page'] = 'landing'
+                forget_analysis_job()
+                release_spooled_pdf()
+                st.rerun()
+            st.stop()
+        
+        result = job.result
+        st.session_state['perf'] = job.perf
+        for name in RESULT_FIELDS:
+            st.session_state[name] = result[name]
+        # A new paper starts with every category selected
+        st.session_state.pop('selected_categories', None)
+        # The highlighted PDF is generated after the dashboard renders
+        pdf_source = st.session_state['pending_source']
+        st.session_state['pdf_source'] = pdf_source
+        st.session_state['doc_key'] = job.key
+        # Hashed once at submission; every later cache key reuses the digest
+        st.session_state['pdf_hash'] = job.pdf_hash
+        forget_analysis_job()
+        if 'spooled_path' in st.session_state:
+            # The spooled copy replaces the upload kept in memory
+            st.session_state.pop('uploaded_file', None)
+        forget_highlight_job()
+        st.session_state['processed'] = True
+        st.rerun()
             
+    # Highlighting starts once the analysis is shown, off the critical path
+    highlight_job = get_highlight_job()
+    
     # Layout
     left_col, right_col = st.columns([1, 3])
     
@@ -372,13 +608,24 @@ elif st.session_state['page'] == 'dashboard':
             st.session_state['page'] = 'landing'
             st.session_state['processed'] = False
             st.session_state.pop('uploaded_file', None)
+            st.session_state.pop('perf', None)
+            forget_highlight_job()
+            st.session_state.pop('pdf_source', None)
+            st.session_state.pop('pdf_hash', None)
+            forget_analysis_job()
+            release_spooled_pdf()
             st.rerun()
 
         st.markdown("### Keyword Analysis")
         st.markdown("<div style='color: var(--text-muted); font-size: 0.9rem; margin-bottom: 1rem;'>Toggle categories to filter results</div>", unsafe_allow_html=True)
+        selected_categories = st.pills(
+            "Categories", list(DEFAULT_KEYWORDS), selection_mode="multi", default=list(DEFAULT_KEYWORDS),
+            key='selected_categories', on_change=apply_category_selection, label_visibility="collapsed",
+        )
         
         stats = st.session_state['stats']
         keyword_counts = st.session_state['keyword_counts']
+        keyword_forms = st.session_state.get('keyword_forms', {})
         
         # Helper to render stat card
         def render_stat_card(category, color_class, icon_class, icon_char):
@@ -405,17 +652,27 @@ elif st.session_state['page'] == 'dashboard':
                 sorted_kws = sorted(cat_keywords.items(), key=lambda item: item[1], reverse=True)
                 
                 for kw, cnt in sorted_kws:
+                    # Spellings found in the text, when they differ from the keyword
+                    forms = keyword_forms.get(kw, {})
+                    forms_html = ""
+                    if set(forms) - {kw}:
+                        forms_text = ", ".join(f"{html.escape(form)} ({n})" for form, n in sorted(forms.items(), key=lambda item: item[1], reverse=True))
+                        forms_html = f"<div style='color: #888; font-size: 0.8rem;'>{forms_text}</div>"
                     st.markdown(f"""
                     <div class="keyword-item">
-                        <span>{kw}</span>
+                        <span>{kw}{forms_html}</span>
                         <span style="color: #888;">{cnt}</span>
                     </div>
                     """, unsafe_allow_html=True)
 
-        render_stat_card("Errors/Mistakes", "border-red", "icon-red", "■")
-        render_stat_card("Novelty/Contribution", "border-green", "icon-green", "■")
-        render_stat_card("Methodology", "border-blue", "icon-blue", "■")
-        render_stat_card("Analysis/Results", "border-purple", "icon-purple", "■")
+        for category, color_class, icon_class in [
+            ("Errors/Mistakes", "border-red", "icon-red"),
+            ("Novelty/Contribution", "border-green", "icon-green"),
+            ("Methodology", "border-blue", "icon-blue"),
+            ("Analysis/Results", "border-purple", "icon-purple"),
+        ]:
+            if category in selected_categories:
+                render_stat_card(category, color_class, icon_class, "■")
         
 
             
@@ -424,20 +681,52 @@ elif st.session_state['page'] == 'dashboard':
             st.sidebar.markdown("---")
             with st.sidebar.expander("Detected Citations", expanded=False):
                 citations = st.session_state['citations']
-                if citations:
-                    for c in citations:
-                        st.markdown(f"- {c}")
+                if citations['citations']:
+                    references = citations['references']
+                    st.caption(f"{len(citations['citations'])} in-text citations, {len(references)} references")
+                    # Most cited first; one markdown call for the whole list
+                    ranked = sorted(references, key=lambda r: r['count'], reverse=True)
+                    if ranked:
+                        st.markdown("\n".join(
+                            f"- **[{r['key']}]** ×{r['count']}: {r['text'][:CITATION_TEXT_CHARS]}{'...' if len(r['text']) > CITATION_TEXT_CHARS else ''}"
+                            for r in ranked
+                        ))
+                    if citations['unresolved']:
+                        unresolved = ", ".join(f"{key} (×{count})" for key, count in citations['unresolved'].items())
+                        st.caption(f"Not found in the references: {unresolved}")
                 else:
                     st.info("No citations detected.")
+            
+            cache_stats = get_result_cache().stats()
+            st.sidebar.caption(f"Result cache: {cache_stats['memory_hits'] + cache_stats['disk_hits']} hits, {cache_stats['misses']} misses")
+        
+        # --- Performance Panel ---
+        with st.sidebar.expander("Performance", expanded=False):
+            # Kept under a non-widget key so the choice survives the trip back to the landing page
+            st.session_state['perf_enabled'] = st.checkbox("Record stage timings for the next analysis", value=st.session_state.get('perf_enabled', perf.ENABLED))
+            perf_rows = st.session_state.get('perf')
+            if perf_rows:
+                st.dataframe(pd.DataFrame(perf_rows), hide_index=True, use_container_width=True)
+            elif perf_rows is not None:
+                st.caption("Served from the result cache; nothing was recomputed.")
+            else:
+                st.caption("No timings recorded for this paper.")
 
     with right_col:
         # --- Phase 2: Triage Deck ---
         if 'triage_data' in st.session_state:
             triage = st.session_state['triage_data']
             st.markdown("### AI Triage Deck")
-            t1, t2, t3 = st.columns(3)
             
-            def render_triage_card(title, content, emoji):
+            def render_triage_card(title, candidates, emoji):
+                if candidates:
+                    best = candidates[0]
+                    content = f"{html.escape(best['sentence'])} <span style='color: var(--text-muted);'>(p. {best['page']})</span>"
+                    # Runner-up candidates, in case the heuristic picked the wrong one
+                    for other in candidates[1:]:
+                        content += f"<div style='font-size: 0.8rem; color: var(--text-muted); margin-top: 8px;'>p. {other['page']}: {html.escape(other['sentence'])}</div>"
+                else:
+                    content = "Not detected."
                 st.markdown(f"""
                 <div class="card" style="height: 200px; overflow-y: auto;">
                     <div style="font-weight: bold; margin-bottom: 8px; color: var(--accent-color);">{emoji} {title}</div>
@@ -445,12 +734,14 @@ elif st.session_state['page'] == 'dashboard':
                 </div>
                 """, unsafe_allow_html=True)
             
-            with t1:
-                render_triage_card("The Gap", triage['research_gap'], "🎯")
-            with t2:
-                render_triage_card("Data Source", triage['dataset_used'], "📊")
-            with t3:
-                render_triage_card("The Verdict", triage['main_conclusion'], "💡")
+            # Built-in categories first, then any registered in triage.TRIAGE_CATEGORIES
+            cards = [(key, title, emoji) for key, (title, emoji) in TRIAGE_CARDS.items() if key in triage]
+            cards += [(key, key.replace("_", " ").title(), "🔎") for key in triage if key not in TRIAGE_CARDS]
+            for row_start in range(0, len(cards), 3):
+                columns = st.columns(3)
+                for column, (key, title, emoji) in zip(columns, cards[row_start:row_start + 3]):
+                    with column:
+                        render_triage_card(title, triage[key], emoji)
             
             st.markdown("<div style='margin-bottom: 2rem;'></div>", unsafe_allow_html=True)
 
@@ -469,12 +760,34 @@ elif st.session_state['page'] == 'dashboard':
         # Download Button (Streamlit button needs to be outside HTML block for functionality)
         st.download_button(
             label="⬇ Download Highlighted PDF",
-            data=st.session_state['highlighted_pdf'],
+            # Deferred: waits for the background job when clicked before it finishes
+            data=functools.partial(load_highlighted_pdf, highlight_job, st.session_state['pdf_source'], st.session_state['keyword_map'], st.session_state['pdf_hash']),
             file_name="highlighted_paper.pdf",
             mime="application/pdf",
             type="primary",
             use_container_width=True
         )
+        # Highlights only (a few KB), to apply to the original PDF later (`skimmate apply-overlay`) or import into a PDF viewer
+        export_overlay = functools.partial(
+            export_highlight_overlay, st.session_state['pdf_source'], st.session_state['keyword_map'], st.session_state['pdf_hash']
+        )
+        overlay_json_col, overlay_xfdf_col = st.columns(2)
+        with overlay_json_col:
+            st.download_button(
+                label="Highlights overlay (JSON)",
+                data=functools.partial(export_overlay, "json"),
+                file_name="highlights.overlay.json",
+                mime="application/json",
+                use_container_width=True
+            )
+        with overlay_xfdf_col:
+            st.download_button(
+                label="Highlights overlay (XFDF)",
+                data=functools.partial(export_overlay, "xfdf"),
+                file_name="highlights.xfdf",
+                mime="application/vnd.adobe.xfdf",
+                use_container_width=True
+            )
         
         # --- Extracted Sentences Preview ---
         st.markdown("""
@@ -483,49 +796,63 @@ elif st.session_state['page'] == 'dashboard':
         </div>
         """, unsafe_allow_html=True)
         
-        with st.container(height=500):
-            # Group sentences by keyword
-            context_data = st.session_state.get('context_data', [])
-            grouped_sentences = {}
-            for item in context_data:
-                kw = item['keyword']
-                if kw not in grouped_sentences:
-                    grouped_sentences[kw] = []
-                grouped_sentences[kw].append(item['sentence'])
+        context_data = st.session_state.get('context_data')
+        if not context_data:
+            st.info("No sentences found with the selected keywords.")
+        else:
+            # Snippet HTML is built during analysis; a rerun only filters row
+            # indices and renders the visible page
+            filter_cols = st.columns([2, 2, 1])
+            with filter_cols[0]:
+                keyword_filter = st.selectbox("Keyword", ["All"] + sorted(context_data.keywords), key='preview_keyword', on_change=reset_preview_page)
+            with filter_cols[1]:
+                category_filter = st.selectbox("Category", ["All"] + sorted(context_data.categories), key='preview_category', on_change=reset_preview_page)
+            rows = context_data.filter_rows(
+                keyword=None if keyword_filter == "All" else keyword_filter,
+                category=None if category_filter == "All" else category_filter,
+            )
+            page_total = max(1, -(-len(rows) // PREVIEW_PAGE_SIZE))
+            with filter_cols[2]:
+                preview_page = st.number_input("Page", min_value=1, max_value=page_total, step=1, key='preview_page')
+            first = (min(preview_page, page_total) - 1) * PREVIEW_PAGE_SIZE
+            visible = rows[first:first + PREVIEW_PAGE_SIZE]
+            st.caption(f"Showing {first + 1 if visible else 0}–{first + len(visible)} of {len(rows)} sentences")
+            st.pills(
+                "Jump to page", sorted({context_data.page[index] for index in visible}),
+                format_func=lambda page: f"p.{page}", key='jump_page', on_change=jump_to_page,
+            )
             
-            # Display
-            if not grouped_sentences:
-                st.info("No sentences found with the selected keywords.")
-            else:
-                for kw in sorted(grouped_sentences.keys()):
-                    st.markdown(f"<div style='color: var(--accent-color); font-weight: bold; margin-top: 10px; margin-bottom: 5px;'>--- {kw.upper()} ---</div>", unsafe_allow_html=True)
-                    for i, sentence in enumerate(grouped_sentences[kw], 1):
-                        # Find keyword and truncate
-                        # Case-insensitive search
-                        match = re.search(f"({re.escape(kw)})", sentence, re.IGNORECASE)
-                        if match:
-                            start, end = match.span()
-                            # Context window
-                            context_chars = 100
-                            s_start = max(0, start - context_chars)
-                            s_end = min(len(sentence), end + context_chars)
-                            
-                            prefix = "..." if s_start > 0 else ""
-                            suffix = "..." if s_end < len(sentence) else ""
-                            
-                            snippet = sentence[s_start:s_end]
-                            
-                            # Highlight keyword in snippet
-                            # We use a simple replace here on the snippet, but need to be careful with case
-                            # A safer way is to re-find in snippet or just highlight the match we found if it's in range
-                            # Let's just use regex sub on the snippet for simplicity, ensuring we only highlight the keyword
-                            snippet_html = re.sub(f"({re.escape(kw)})", r"<span style='background-color: rgba(255, 255, 0, 0.2); color: #FFD700; font-weight: bold; padding: 0 4px; border-radius: 4px;'>\1</span>", snippet, flags=re.IGNORECASE)
-                            
-                            display_text = f"{prefix}{snippet_html}{suffix}"
-                        else:
-                            display_text = sentence # Fallback
-                            
-                        st.markdown(f"<div style='font-size: 0.9rem; margin-bottom: 8px; color: var(--text-color);'>{i}. {display_text}</div>", unsafe_allow_html=True)
+            parts = []
+            current_kw = None
+            for index in visible:
+                row = context_data[index]
+                if row.keyword != current_kw:
+                    current_kw = row.keyword
+                    parts.append(f"<div style='color: var(--accent-color); font-weight: bold; margin-top: 10px; margin-bottom: 5px;'>--- {html.escape(current_kw.upper())} ---</div>")
+                parts.append(f"<div style='font-size: 0.9rem; margin-bottom: 8px; color: var(--text-color);'>p.{row.page} · {row.snippet}</div>")
+            with st.container(height=500):
+                st.markdown("".join(parts), unsafe_allow_html=True)
+
+        # --- Search in the Paper ---
+        # Looked up in the index built during analysis; nothing is rescanned
+        search_index = st.session_state.get('search_index')
+        if search_index is not None:
+            query = st.text_input("Search this paper", placeholder="Any word or phrase, e.g. sample size", key='search_query')
+            if query.strip():
+                hits, total = search_index.search(query, limit=SEARCH_RESULTS)
+                if hits:
+                    st.caption(f"Showing the best {len(hits)} of {total} matching sentences")
+                    st.pills(
+                        "Jump to page", sorted({hit['page'] for hit in hits}),
+                        format_func=lambda page: f"p.{page}", key='search_jump_page', on_change=jump_to_page, args=('search_jump_page',),
+                    )
+                    with st.container(height=300):
+                        st.markdown("".join(
+                            f"<div style='font-size: 0.9rem; margin-bottom: 8px; color: var(--text-color);'>p.{hit['page']} · {hit['snippet']}</div>"
+                            for hit in hits
+                        ), unsafe_allow_html=True)
+                else:
+                    st.info("No sentences contain these words.")
 
         # PDF Preview Section
         st.markdown("""
@@ -535,4 +862,35 @@ elif st.session_state['page'] == 'dashboard':
         </div>
         """, unsafe_allow_html=True)
         
-        pdf_viewer(input=st.session_state['highlighted_pdf'], width=700, height=800)
+        # Page images by default: only the visible pages are rasterized (and
+        # cached); the full viewer ships the whole file to the browser
+        preview_mode = st.radio("Preview mode", ["Page images", "Full PDF"], horizontal=True, key='pdf_preview_mode', label_visibility="collapsed")
+        error = highlight_error(highlight_job)
+        highlight_ready = highlight_job.done() and error is None
+        if highlight_ready:
+            preview_pdf, preview_id = highlight_job.result(), st.session_state['doc_key'] + "-highlighted"
+        else:
+            # Until highlighting finishes (or if it failed), page images show the original paper
+            preview_pdf, preview_id = st.session_state['pdf_source'], st.session_state['doc_key'] + "-original"
+            if error is None:
+                wait_for_highlighting(highlight_job)
+            else:
+                st.warning(f"Highlighting failed ({type(error).__name__}: {error}); showing the original paper.")
+                if st.button("Retry highlighting"):
+                    forget_highlight_job()
+                    st.rerun()
+        
+        page_renderer = get_page_render_cache()
+        preview_page_count = page_renderer.page_count(preview_id, preview_pdf)
+        if preview_mode == "Full PDF":
+            if highlight_ready:
+                pdf_viewer(input=preview_pdf, width=700, height=800, scroll_to_page=st.session_state.get('pdf_preview_page'))
+        else:
+            nav_cols = st.columns([1, 2])
+            with nav_cols[0]:
+                first_page = st.number_input("Page", min_value=1, max_value=preview_page_count, step=1, key='pdf_preview_page')
+            with nav_cols[1]:
+                dpi = st.select_slider("Resolution (DPI)", options=PREVIEW_DPI_OPTIONS, value=DEFAULT_PREVIEW_DPI, key='pdf_preview_dpi')
+            page_nums = list(range(first_page - 1, min(first_page - 1 + PREVIEW_VISIBLE_PAGES, preview_page_count)))
+            images = page_renderer.render_pages(preview_id, preview_pdf, page_nums, dpi)
+            st.image(images, caption=[f"Page {page_num + 1}" for page_num in page_nums], width=700)
@@ -0,0 +1,175 @@
+import json
+import os
+import sys
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import overlay
+import pipeline
+from utils import CATEGORY_COLORS
+
+# Papers queued per worker; bounds memory no matter how large the archive is
+QUEUE_PER_WORKER = 2
+
+def find_pdfs(directory):
+    """Returns the paths of every PDF under directory, relative to it, in sorted order."""
+    found = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                found.append(os.path.relpath(os.path.join(root, name), directory))
+    return found
+
+def read_results(output_path):
+    """Yields the records of a results JSONL file written by run_batch, in file order."""
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Partial last line from an interrupted run
+                continue
+
+def load_done(output_path):
+    """Returns the files already analyzed successfully according to a results JSONL file."""
+    if not os.path.exists(output_path):
+        return set()
+    return {record["file"] for record in read_results(output_path) if "error" not in record}
+
+def run_batch(directory, output_path, keyword_map, workers=None, highlight_dir=None, include_context=False,
+              overlay_dir=None, overlay_format="json", log=sys.stderr):
+    """
+    Analyzes every PDF under directory with a bounded process pool and
+    appends one JSON line per paper to output_path as results come in.
+    Papers already recorded in output_path are skipped, so an interrupted
+    run can be resumed. Highlighted PDFs are written to highlight_dir when given,
+    and highlight overlays (see overlay.py) to overlay_dir, as overlay_format.
+    When a worker process dies (e.g. killed for using too much memory), the
+    papers in flight are recorded as failed, so a resumed run retries them,
+    and the rest of the batch continues on a new pool.
+    Returns:
+        - dict with processed, failed, skipped, seconds and papers_per_second
+    """
+    workers = workers or os.cpu_count() or 1
+    files = find_pdfs(directory)
+    done = load_done(output_path)
+    todo = [name for name in files if name not in done]
+    skipped = len(files) - len(todo)
+    if skipped:
+        print(f"Skipping {skipped} papers already in {output_path}", file=log)
+
+    processed = failed = 0
+    broken = False
+    start = time.monotonic()
+
+    def record(future, name):
+        nonlocal broken
+        try:
+            result = future.result()
+        except BrokenProcessPool as e:
+            # Which of the papers in flight killed the worker is unknown, so each gets an error record
+            broken = True
+            result = {"file": name, "error": f"{type(e).__name__}: a worker process died"}
+        write(result)
+
+    def write(result):
+        nonlocal processed, failed
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        out.flush()
+        if "error" in result:
+            failed += 1
+        else:
+            processed += 1
+        finished = processed + failed
+        rate = finished / max(time.monotonic() - start, 1e-9)
+        status = "failed: " + result["error"] if "error" in result else "ok"
+        print(f"[{finished}/{len(todo)}] {result['file']} {status} ({rate:.2f} papers/s)", file=log)
+
+    # In-flight futures and the file each one analyzes
+    pending = {}
+
+    def collect(return_when):
+        finished, _ = wait(pending, return_when=return_when)
+        for future in finished:
+            record(future, pending.pop(future))
+
+    def submit(name):
+        nonlocal pool, broken
+        # The pool can also break after the last results were collected; then
+        # submit raises and the paper is queued again on a new pool (once)
+        for _ in range(2):
+            if broken:
+                # A pool whose worker died takes no more work: the papers
+                # still in it fail with it, and a new pool takes the rest
+                collect(ALL_COMPLETED)
+                pool.shutdown()
+                pool = ProcessPoolExecutor(max_workers=workers)
+                broken = False
+                print("A worker process died; restarted the pool", file=log)
+            try:
+                pending[pool.submit(analyze_file, directory, name, keyword_map, highlight_dir, include_context, overlay_dir, overlay_format)] = name
+                return
+            except BrokenProcessPool:
+                broken = True
+        write({"file": name, "error": "BrokenProcessPool: the worker pool could not be restarted"})
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            for name in todo:
+                if len(pending) >= workers * QUEUE_PER_WORKER:
+                    collect(FIRST_COMPLETED)
+                submit(name)
+            while pending:
+                collect(FIRST_COMPLETED)
+        finally:
+            pool.shutdown()
+
+    seconds = time.monotonic() - start
+    summary = {
+        "processed": processed,
+        "failed": failed,
+        "skipped": skipped,
+        "seconds": round(seconds, 3),
+        "papers_per_second": round((processed + failed) / seconds, 3) if seconds else 0.0,
+    }
+    print(f"Done: {processed} analyzed, {failed} failed, {skipped} skipped in {seconds:.1f}s ({summary['papers_per_second']} papers/s)", file=log)
+    return summary
+
+def analyze_file(directory, name, keyword_map, highlight_dir=None, include_context=False, overlay_dir=None, overlay_format="json"):
+    """
+    Worker entry point: analyzes one paper and returns its JSON record.
+    Errors are returned as a record instead of raised, so one broken PDF
+    does not stop the batch.
+    """
+    start = time.monotonic()
+    path = os.path.join(directory, name)
+    highlighted_path = None
+    if highlight_dir is not None:
+        highlighted_path = os.path.join(highlight_dir, os.path.splitext(name)[0] + ".highlighted.pdf")
+    overlay_path = None
+    if overlay_dir is not None:
+        overlay_path = os.path.join(overlay_dir, f"{os.path.splitext(name)[0]}.overlay.{overlay_format}")
+    try:
+        # Papers already run in parallel here, so each stays in its worker
+        # process. Opening by path keeps the PDF on disk instead of in memory.
+        result = pipeline.run_analysis(path, keyword_map, CATEGORY_COLORS, workers=1)
+        if highlighted_path is not None:
+            os.makedirs(os.path.dirname(highlighted_path), exist_ok=True)
+            pipeline.highlight_document(path, keyword_map, CATEGORY_COLORS, output_path=highlighted_path)
+        if overlay_path is not None:
+            os.makedirs(os.path.dirname(overlay_path), exist_ok=True)
+            overlay.save_overlay(pipeline.overlay_document(path, keyword_map, CATEGORY_COLORS), overlay_path, overlay_format)
+    except Exception as e:
+        return {"file": name, "error": f"{type(e).__name__}: {e}"}
+
+    record = {"file": name}
+    record.update(pipeline.result_record(result, include_context))
+    if highlighted_path is not None:
+        record["highlighted_pdf"] = highlighted_path
+    if overlay_path is not None:
+        record["overlay"] = overlay_path
+    record["seconds"] = round(time.monotonic() - start, 3)
+    return record
@@ -0,0 +1,210 @@
+import fitz  # PyMuPDF
+import json
+import os
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+
+import pipeline
+import processor
+from utils import CATEGORY_COLORS, DEFAULT_KEYWORDS, get_flattened_keywords
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+# A stage regresses when its median time grows by more than this fraction
+DEFAULT_THRESHOLD = 0.25
+
+# Synthetic papers: page count, share of words that are keywords, text columns
+SCENARIOS = [
+    {"name": "short-1col", "pages": 8, "density": 0.05, "columns": 1},
+    {"name": "medium-2col", "pages": 40, "density": 0.05, "columns": 2},
+    {"name": "dense-2col", "pages": 40, "density": 0.15, "columns": 2},
+    {"name": "long-1col", "pages": 150, "density": 0.05, "columns": 1},
+]
+QUICK_SCENARIOS = ["short-1col", "medium-2col"]
+
+STAGES = ["parse_pdf", "extract_sentences_with_keywords", "generate_paper_triage", "extract_citations", "highlight_pdf", "pipeline"]
+
+FILLER_WORDS = (
+    "the of and to in a is that for it as was with be by on not this are which from or an were "
+    "we our these between under while each into such when more than using both across their "
+    "system network signal protein sample patient method value measure study group effect "
+    "response level rate time process structure energy surface field phase layer data"
+).split()
+
+def make_synthetic_paper(pages, density, columns, seed=0):
+    """
+    Generates a deterministic paper-like PDF with PyMuPDF.
+    Sentences mix filler words with default keywords at the given density,
+    pages are laid out in 1 or 2 columns, and the paper ends with in-text
+    citations and a numbered references section.
+    Returns:
+        - bytes: PDF content
+    """
+    rng = random.Random(seed)
+    keywords = [kw for kws in DEFAULT_KEYWORDS.values() for kw in kws]
+    doc = fitz.open()
+    width, height, margin, gap = 595, 842, 50, 20
+    column_width = (width - 2 * margin - gap * (columns - 1)) / columns
+
+    for page_num in range(pages):
+        page = doc.new_page(width=width, height=height)
+        for column in range(columns):
+            x0 = margin + column * (column_width + gap)
+            rect = fitz.Rect(x0, margin, x0 + column_width, height - margin)
+            sentences = []
+            for _ in range(int(40 / columns)):
+                words = [rng.choice(keywords) if rng.random() < density else rng.choice(FILLER_WORDS)
+                         for _ in range(rng.randint(8, 24))]
+                sentence = " ".join(words).capitalize()
+                if rng.random() < 0.1:
+                    sentence += f" [{rng.randint(1, 40)}]"
+                sentences.append(sentence + ".")
+            page.insert_textbox(rect, " ".join(sentences), fontsize=9, fontname="helv")
+
+    page = doc.new_page(width=width, height=height)
+    references = "References\n" + "\n".join(
+        f"[{i}] Author{i} A., Writer B. A study of {rng.choice(FILLER_WORDS)} {rng.choice(FILLER_WORDS)}. Journal {i % 7}, {1990 + i % 30}."
+        for i in range(1, 41)
+    )
+    page.insert_textbox(fitz.Rect(margin, margin, width - margin, height - margin), references, fontsize=8, fontname="helv")
+    return doc.tobytes()
+
+def time_stages(pdf_bytes, keyword_map, repeat=3):
+    """
+    Times every processor stage and the full pipeline on one PDF.
+    Returns:
+        - dict {stage: {"seconds": median wall time, "peak_kb": peak Python allocation}}
+    """
+    timings = {stage: [] for stage in STAGES}
+    for _ in range(repeat):
+        for stage, seconds in _run_stages(pdf_bytes, keyword_map).items():
+            timings[stage].append(seconds)
+
+    # Allocation is measured in a separate run since tracemalloc slows everything down
+    peaks = _run_stages(pdf_bytes, keyword_map, measure_memory=True)
+    return {
+        stage: {"seconds": round(statistics.median(timings[stage]), 4), "peak_kb": round(peaks[stage] / 1024, 1)}
+        for stage in STAGES
+    }
+
+def _run_stages(pdf_bytes, keyword_map, measure_memory=False):
+    results = {}
+
+    def run(stage, func, *args, **kwargs):
+        if measure_memory:
+            tracemalloc.start()
+            value = func(*args, **kwargs)
+            results[stage] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            start = time.perf_counter()
+            value = func(*args, **kwargs)
+            results[stage] = time.perf_counter() - start
+        return value
+
+    doc = run("parse_pdf", processor.parse_pdf, pdf_bytes)
+    try:
+        run("extract_sentences_with_keywords", processor.extract_sentences_with_keywords, doc, keyword_map)
+        run("generate_paper_triage", processor.generate_paper_triage, doc)
+        run("extract_citations", processor.extract_citations, doc)
+        # Annotates the document in place, so it runs last
+        run("highlight_pdf", processor.highlight_pdf, doc, keyword_map, CATEGORY_COLORS)
+    finally:
+        doc.close()
+    # Serial and uncached, so the numbers do not depend on core count or earlier runs
+    run("pipeline", pipeline.run_analysis, pdf_bytes, keyword_map, CATEGORY_COLORS, workers=1, highlight=True)
+    return results
+
+def count_annotations(pdf_bytes, keyword_map):
+    """
+    Highlights a PDF (without saving it) and reports how many keyword
+    matches there were and how many annotations they were merged into.
+    Returns:
+        - dict {"matches", "annotations"}
+    """
+    counts = {"matches": 0, "annotations": 0}
+    doc = processor.parse_pdf(pdf_bytes, lazy=True)
+    try:
+        for _, matches, annotations in processor.iter_highlight_pdf(doc, keyword_map, CATEGORY_COLORS):
+            counts["matches"] += matches
+            counts["annotations"] += annotations
+    finally:
+        doc.close()
+    return counts
+
+def run_benchmarks(scenario_names=None, repeat=3, log=None):
+    """
+    Generates the synthetic corpus and times every scenario.
+    Returns:
+        - dict with machine info, {scenario: {stage: {seconds, peak_kb}}} and
+          the highlight annotation counts of every scenario (see count_annotations)
+    """
+    keyword_map = get_flattened_keywords(list(DEFAULT_KEYWORDS.keys()), [])
+    results = {}
+    annotations = {}
+    for scenario in SCENARIOS:
+        if scenario_names and scenario["name"] not in scenario_names:
+            continue
+        pdf_bytes = make_synthetic_paper(scenario["pages"], scenario["density"], scenario["columns"])
+        results[scenario["name"]] = time_stages(pdf_bytes, keyword_map, repeat=repeat)
+        annotations[scenario["name"]] = count_annotations(pdf_bytes, keyword_map)
+        if log:
+            total = results[scenario["name"]]["pipeline"]["seconds"]
+            print(f"{scenario['name']}: pipeline {total:.3f}s", file=log)
+    return {
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "pymupdf": fitz.VersionBind,
+        "scenarios": results,
+        "annotations": annotations,
+    }
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD, stage_thresholds=None):
+    """
+    Compares benchmark results against a baseline.
+    Returns:
+        - list of (scenario, stage, baseline_seconds, current_seconds, change) for
+          every stage that slowed down by more than its threshold
+    """
+    stage_thresholds = stage_thresholds or {}
+    regressions = []
+    for name, stages in current["scenarios"].items():
+        base_stages = baseline["scenarios"].get(name)
+        if not base_stages:
+            continue
+        for stage, measured in stages.items():
+            if stage not in base_stages:
+                continue
+            before = base_stages[stage]["seconds"]
+            after = measured["seconds"]
+            change = (after - before) / before if before else 0.0
+            if change > stage_thresholds.get(stage, threshold):
+                regressions.append((name, stage, before, after, change))
+    return regressions
+
+def format_results(results, baseline=None):
+    """Formats results as a table, with the change against baseline when given."""
+    lines = [f"{'scenario':<14} {'stage':<33} {'seconds':>9} {'peak KB':>10} {'change':>8}"]
+    for name, stages in results["scenarios"].items():
+        base_stages = (baseline or {}).get("scenarios", {}).get(name, {})
+        for stage, measured in stages.items():
+            change = ""
+            if stage in base_stages and base_stages[stage]["seconds"]:
+                change = f"{(measured['seconds'] / base_stages[stage]['seconds'] - 1) * 100:+.0f}%"
+            lines.append(f"{name:<14} {stage:<33} {measured['seconds']:>9.4f} {measured['peak_kb']:>10.1f} {change:>8}")
+    # Baselines saved before annotation counts were recorded have none
+    for name, counts in results.get("annotations", {}).items():
+        saved = 1 - counts["annotations"] / counts["matches"] if counts["matches"] else 0.0
+        lines.append(f"{name:<14} {counts['matches']} matches highlighted with {counts['annotations']} annotations ({saved * 100:.0f}% fewer)")
+    return "\n".join(lines)
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_baseline(results, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import pickle
+import stat
+import tempfile
+import threading
+from collections import OrderedDict
+
+from triage import TRIAGE_CATEGORIES
+
+# Bump when the analysis output changes so stale entries are not served
+CACHE_VERSION = 13
+
+# Per-user by default: entries are unpickled, so nobody else may be able to write there
+DEFAULT_CACHE_DIR = os.environ.get("SKIMMATE_CACHE_DIR") or os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "skimmate"
+)
+DEFAULT_MEMORY_ITEMS = 32
+DEFAULT_DISK_BYTES = 1024 * 1024 * 1024  # 1 GB
+# Disk tier entries: result pickles and output files
+CACHE_FILE_SUFFIXES = (".pkl", ".pdf")
+
+# Read size when hashing a PDF on disk
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def hash_pdf(pdf):
+    """Hashes the bytes of a PDF, or the file at a path without reading it into memory at once."""
+    if isinstance(pdf, (bytes, bytearray)):
+        return hashlib.sha256(pdf).hexdigest()
+    digest = hashlib.sha256()
+    with open(pdf, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def ensure_private_dir(path):
+    """
+    Creates path (mode 0o700) if needed and checks that only the current
+    user can write to it, since the disk tier unpickles whatever is there.
+    Raises:
+        - PermissionError for a symlink, a directory owned by another user,
+          or one that is group- or world-writable
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        raise PermissionError(f"Cache directory {path} is not a directory (symlinks are refused)")
+    # Ownership and mode bits are only meaningful on POSIX
+    if hasattr(os, "getuid"):
+        if st.st_uid != os.getuid():
+            raise PermissionError(f"Cache directory {path} is owned by another user; set SKIMMATE_CACHE_DIR to a private directory")
+        if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise PermissionError(f"Cache directory {path} is writable by other users; run chmod 700 on it or set SKIMMATE_CACHE_DIR")
+    return path
+
+def hash_keywords(keyword_map):
+    """Hashes a flattened keyword map (or the triage categories) independently of its insertion order."""
+    payload = json.dumps(sorted(keyword_map.items()), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def cache_key(pdf, keyword_map, kind=None, pdf_hash=None):
+    """
+    Content address of an analysis: PDF hash + keyword set hash + cache version.
+    pdf is the PDF's bytes or path.
+    kind tells apart other outputs for the same document and keywords
+    (e.g. "highlighted" for the highlighted PDF).
+    pdf_hash is hash_pdf(pdf) when the caller already has it, so a paper
+    is hashed once however many keys are derived from it (pdf may then be None).
+    The triage categories are part of every key: register_triage_category
+    changes triage_data, and an analysis made before it (or reused
+    incrementally from one) must not be served afterwards.
+    """
+    if pdf_hash is None:
+        pdf_hash = hash_pdf(pdf)
+    key = f"v{CACHE_VERSION}-{pdf_hash}-{hash_keywords(keyword_map)[:16]}-{hash_keywords(TRIAGE_CATEGORIES)[:8]}"
+    return f"{key}-{kind}" if kind else key
+
+class ResultCache:
+    """
+    Two-tier cache of analysis results.
+    The memory tier is an LRU of the most recent results; the disk tier
+    keeps one pickle per key and evicts the least recently used files once
+    the directory grows past max_disk_bytes. Large outputs can also be kept
+    as plain files next to the pickles (put_file/get_file), under the same
+    eviction. Safe to share between threads.
+    """
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_memory_items=DEFAULT_MEMORY_ITEMS, max_disk_bytes=DEFAULT_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if cache_dir:
+            ensure_private_dir(cache_dir)
+
+    def get(self, key):
+        """Returns the cached result for key, or None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+
+        result = self._read_disk(key)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, result)
+        return result
+
+    def put(self, key, result):
+        with self._lock:
+            self._remember(key, result)
+        self._write_disk(key, result)
+
+    def put_file(self, key, suffix, path):
+        """
+        Moves a finished output file (e.g. a highlighted PDF, suffix ".pdf")
+        into the disk tier under key and returns its new path. Without a
+        cache directory the file stays where it is.
+        """
+        if not self.cache_dir:
+            return path
+        target = self._file_path(key, suffix)
+        os.replace(path, target)
+        self._evict_disk()
+        return target
+
+    def get_file(self, key, suffix):
+        """Returns the path of the output file kept for key, or None."""
+        path = self._file_path(key, suffix) if self.cache_dir else None
+        if path is None or not os.path.exists(path):
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.disk_hits += 1
+        return path
+
+    def stats(self):
+        """Returns hit/miss counters and the current tier sizes."""
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_items": len(self._memory),
+            }
+
+    def _remember(self, key, result):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _path(self, key):
+        return self._file_path(key, ".pkl")
+
+    def _file_path(self, key, suffix):
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                result = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError):
+            # Truncated or unreadable entry: drop it and recompute
+            self._remove(path)
+            return None
+        # Touch the file so eviction treats it as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return result
+
+    def _write_disk(self, key, result):
+        if not self.cache_dir:
+            return
+        # Write to a temp file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            self._remove(tmp_path)
+            return
+        self._evict_disk()
+
+    def _evict_disk(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(CACHE_FILE_SUFFIXES):
+                continue
+            try:
+                entry_stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((entry_stat.st_mtime, entry_stat.st_size, entry.path))
+            total += entry_stat.st_size
+        # Oldest first
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
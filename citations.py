@@ -0,0 +1,146 @@
+import re
+from bisect import bisect_right
+
+# Longest parenthetical scanned for author-year citations, so a stray "("
+# costs a bounded look-ahead and the scan stays linear in the text length
+MAX_GROUP_LENGTH = 300
+# Ranges wider than this are not expanded and not treated as citations
+MAX_RANGE = 50
+
+# Capitalised words that come before a year in parentheses without naming an
+# author ("In (2020)", "Table (2019)"), so they never count as a surname
+NOT_SURNAMES = (
+    "A", "After", "Also", "An", "And", "As", "At", "Before", "But", "By", "Chapter", "During",
+    "Eq", "Equation", "Fig", "Figure", "Figures", "For", "From", "Here", "However", "In", "It",
+    "Its", "Of", "On", "Or", "Our", "Section", "See", "Since", "Table", "Tables", "That", "The",
+    "Their", "These", "This", "Those", "To", "Until", "We", "With", "Year", "Years",
+)
+SURNAME = rf"(?!(?:{'|'.join(NOT_SURNAMES)})\b)[A-ZÀ-Þ][\w'’\-]+"
+AUTHORS = rf"{SURNAME}(?:\s+(?:and|&)\s+{SURNAME}|\s+et\s+al\.?)?"
+YEAR = r"(?:19|20)\d{2}[a-z]?"
+
+# Every in-text citation form, found in one left-to-right pass:
+#   [3], [1-3], [2, 5, 7–9] (up to three digits, so "[1990-2020]" is not one)
+#   Smith et al. (2020)
+#   (Smith and Lee, 2020; Wu et al., 2019a, 2021)
+CITATION = re.compile(
+    rf"\[(?P<numbers>\d{{1,3}}(?:\s*[-–,]\s*\d{{1,3}})*)\]"
+    rf"|(?P<narrative>{AUTHORS})\s*\((?P<narrative_year>{YEAR})\)"
+    rf"|\((?P<group>[^()]{{1,{MAX_GROUP_LENGTH}}})\)"
+)
+# One "Authors, Year[, Year...]" item inside a parenthetical citation
+AUTHOR_YEAR = re.compile(rf"(?P<authors>{AUTHORS}),?\s+(?P<years>{YEAR}(?:\s*,\s*{YEAR})*)")
+YEAR_PATTERN = re.compile(YEAR)
+
+# Heading of the bibliography, on a line of its own
+REFERENCES_HEADING = re.compile(
+    r"^[ \t]*(?:\d+\.?[ \t]*)?(?:References|REFERENCES|Bibliography|BIBLIOGRAPHY|Works Cited|Literature Cited)[ \t]*$",
+    re.MULTILINE,
+)
+# Start of a reference entry: "[12] ..." or "12. Author", else "Surname, I."
+NUMBERED_ENTRY = re.compile(r"^[ \t]*(?:\[(\d{1,4})\]|(\d{1,4})\.(?=[ \t]+[A-ZÀ-Þ]))[ \t]*", re.MULTILINE)
+AUTHOR_ENTRY = re.compile(rf"^[ \t]*({SURNAME}),[ \t]+[A-ZÀ-Þ]", re.MULTILINE)
+
+def scan_citations(doc):
+    """
+    Finds the in-text citations of a ParsedDocument in one pass, parses its
+    References section and links the two. Ranges and lists ("[1-3]",
+    "[2, 5]") are expanded and parenthetical groups are split into their
+    author-year items. Reference keys are the entry number ("3") or the
+    first author's surname and year ("Smith 2020").
+    Returns:
+        - dict with
+          "citations": [{"marker", "page", "offset", "refs"}] in document order
+          "references": [{"key", "text", "page", "count"}] in bibliography order,
+          count being how often the entry is cited
+          "unresolved": {key: count} for cited keys without an entry
+    """
+    text = doc.text
+    headings = list(REFERENCES_HEADING.finditer(text))
+    # The last heading wins, so a "References" line in the table of contents is skipped
+    references_start = headings[-1].start() if headings else len(text)
+    body_end = references_start
+
+    citations = []
+    for match in CITATION.finditer(text, 0, body_end):
+        refs = _citation_refs(match)
+        if refs:
+            citations.append({
+                "marker": match.group(),
+                "page": _page_of(doc, match.start()) + 1,
+                "offset": match.start(),
+                "refs": refs,
+            })
+
+    references = []
+    if headings:
+        references = _parse_references(doc, text, headings[-1].end())
+
+    # Link markers to entries through a key index
+    index = {reference["key"].lower(): reference for reference in references}
+    unresolved = {}
+    for citation in citations:
+        for key in citation["refs"]:
+            reference = index.get(key.lower())
+            if reference is not None:
+                reference["count"] += 1
+            else:
+                unresolved[key] = unresolved.get(key, 0) + 1
+
+    return {"citations": citations, "references": references, "unresolved": unresolved}
+
+def _citation_refs(match):
+    """Returns the reference keys a CITATION match cites, or [] if it is not a citation."""
+    if match.group("numbers") is not None:
+        return _expand_numbers(match.group("numbers"))
+    if match.group("narrative") is not None:
+        return [_author_key(match.group("narrative"), match.group("narrative_year"))]
+    refs = []
+    for item in AUTHOR_YEAR.finditer(match.group("group")):
+        for year in YEAR_PATTERN.findall(item.group("years")):
+            refs.append(_author_key(item.group("authors"), year))
+    return refs
+
+def _expand_numbers(numbers):
+    """"1-3, 5" -> ["1", "2", "3", "5"]; [] when a range is implausibly wide."""
+    refs = []
+    for part in numbers.split(","):
+        bounds = re.split(r"\s*[-–]\s*", part.strip())
+        first, last = int(bounds[0]), int(bounds[-1])
+        if last < first or last - first > MAX_RANGE:
+            return []
+        refs.extend(str(number) for number in range(first, last + 1))
+    return refs
+
+def _author_key(authors, year):
+    """Key of an author-year citation: first author's surname and year ("Smith 2020")."""
+    return f"{authors.split()[0]} {year}"
+
+def _parse_references(doc, text, start):
+    """Splits the bibliography after start into entries, numbered if it is numbered."""
+    starts = [(m.start(), m.end(), m.group(1) or m.group(2)) for m in NUMBERED_ENTRY.finditer(text, start)]
+    numbered = bool(starts)
+    if not numbered:
+        starts = [(m.start(), m.start(), m.group(1)) for m in AUTHOR_ENTRY.finditer(text, start)]
+
+    references = []
+    for i, (entry_start, text_start, label) in enumerate(starts):
+        entry_end = starts[i + 1][0] if i + 1 < len(starts) else len(text)
+        entry_text = " ".join(text[text_start:entry_end].split())
+        if numbered:
+            key = label
+        else:
+            year = YEAR_PATTERN.search(entry_text)
+            if year is None:
+                continue
+            key = _author_key(label, year.group())
+        references.append({
+            "key": key,
+            "text": entry_text,
+            "page": _page_of(doc, entry_start) + 1,
+            "count": 0,
+        })
+    return references
+
+def _page_of(doc, offset):
+    return bisect_right(doc.page_starts, offset) - 1
@@ -0,0 +1,278 @@
+import html
+from array import array
+from collections import defaultdict
+
+# Characters of context kept on each side of the keyword in a preview snippet
+SNIPPET_CONTEXT_CHARS = 100
+# CSS class of the highlighted matches in a snippet (styled by the app)
+SNIPPET_HIGHLIGHT_CLASS = "snippet-match"
+
+def make_snippet(sentence, offsets):
+    """
+    Builds the preview HTML for one keyword in a sentence: a window of
+    SNIPPET_CONTEXT_CHARS around the first match, with every match inside
+    the window highlighted. offsets are (start, end) pairs relative to the
+    sentence, in order, as found by the keyword matcher.
+    """
+    if not offsets:
+        return html.escape(sentence)
+    first_start, first_end = offsets[0]
+    window_start = max(0, first_start - SNIPPET_CONTEXT_CHARS)
+    window_end = min(len(sentence), first_end + SNIPPET_CONTEXT_CHARS)
+
+    parts = ["..." if window_start > 0 else ""]
+    pos = window_start
+    for start, end in offsets:
+        if start < pos or end > window_end:
+            continue
+        parts.append(html.escape(sentence[pos:start]))
+        parts.append(f"<span class='{SNIPPET_HIGHLIGHT_CLASS}'>{html.escape(sentence[start:end])}</span>")
+        pos = end
+    parts.append(html.escape(sentence[pos:window_end]))
+    parts.append("..." if window_end < len(sentence) else "")
+    return "".join(parts)
+
+class ContextTable:
+    """
+    Compact, columnar store of keyword matches (one row per sentence/keyword pair).
+    Each sentence text is stored once; rows are parallel integer arrays of
+    page, sentence id, keyword id and category id, with keywords and
+    categories interned in small lookup tables. Iterating yields ContextRow
+    views that read like the {page, sentence, keyword, category} dicts used
+    before, without allocating a dict per row. Each row also keeps the
+    surface form the keyword appeared as ("verified" for "verify") and the
+    keyword's offsets in the sentence, in one flat array shared by all rows;
+    the preview snippet HTML is rendered from them only when a row's
+    snippet is read (i.e. for the rows on screen). Sentences keep
+    their offset in the document text, so the rows of single sentences can
+    be replaced when the keywords change (replace_sentences).
+    """
+    def __init__(self):
+        self.sentences = []
+        self.sentence_starts = array("I")
+        self.keywords = []
+        self.categories = []
+        self._keyword_ids = {}
+        self._category_ids = {}
+        self.forms = []
+        self._form_ids = {}
+        self.page = array("I")
+        self.sentence_id = array("I")
+        self.keyword_id = array("H")
+        self.category_id = array("H")
+        self.form_id = array("H")
+        # Flat (start, end) pairs of every row; row i owns pairs offset_start[i] up to offset_start[i + 1]
+        self.match_offsets = array("I")
+        self.offset_start = array("I")
+        self._by_keyword = None
+
+    def add_sentence(self, sentence, start=0):
+        """
+        Stores a sentence and returns its id, for the rows that reference it.
+        start is the sentence's offset in the document text.
+        """
+        self.sentences.append(sentence)
+        self.sentence_starts.append(start)
+        return len(self.sentences) - 1
+
+    def add(self, page, sentence_id, keyword, category, offsets=(), form=None):
+        """
+        Appends a row; page is 1-based. offsets are the keyword's (start, end)
+        positions in the sentence, used to build the preview snippet. form is
+        the spelling found in the text (defaults to the keyword).
+        """
+        self._append(page, sentence_id, keyword, category, form or keyword, offsets)
+
+    def _append(self, page, sentence_id, keyword, category, form, offsets):
+        self.offset_start.append(len(self.match_offsets) // 2)
+        for start, end in offsets:
+            self.match_offsets.append(start)
+            self.match_offsets.append(end)
+        self._by_keyword = None
+        self.page.append(page)
+        self.sentence_id.append(sentence_id)
+        self.keyword_id.append(self._intern(keyword, self.keywords, self._keyword_ids))
+        self.category_id.append(self._intern(category, self.categories, self._category_ids))
+        self.form_id.append(self._intern(form, self.forms, self._form_ids))
+
+    def extend(self, other):
+        """Appends every row of another table (e.g. the result of one page)."""
+        sentence_offset = len(self.sentences)
+        self.sentences.extend(other.sentences)
+        self.sentence_starts.extend(other.sentence_starts)
+        pair_offset = len(self.match_offsets) // 2
+        self.offset_start.extend(array("I", (i + pair_offset for i in other.offset_start)))
+        self.match_offsets.extend(other.match_offsets)
+        self._by_keyword = None
+        keyword_map = [self._intern(kw, self.keywords, self._keyword_ids) for kw in other.keywords]
+        category_map = [self._intern(c, self.categories, self._category_ids) for c in other.categories]
+        self.page.extend(other.page)
+        self.sentence_id.extend(array("I", (i + sentence_offset for i in other.sentence_id)))
+        self.keyword_id.extend(array("H", (keyword_map[i] for i in other.keyword_id)))
+        self.category_id.extend(array("H", (category_map[i] for i in other.category_id)))
+        form_map = [self._intern(f, self.forms, self._form_ids) for f in other.forms]
+        self.form_id.extend(array("H", (form_map[i] for i in other.form_id)))
+
+    def __len__(self):
+        return len(self.page)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return ContextRow(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield ContextRow(self, index)
+
+    def __eq__(self, other):
+        if not isinstance(other, ContextTable):
+            return NotImplemented
+        return len(self) == len(other) and all(a.to_dict() == b.to_dict() for a, b in zip(self, other))
+
+    def rows_by_keyword(self):
+        """Returns {keyword: [row index, ...]} with rows in document order."""
+        if self._by_keyword is None:
+            grouped = {}
+            keywords = self.keywords
+            for index, keyword_id in enumerate(self.keyword_id):
+                grouped.setdefault(keywords[keyword_id], []).append(index)
+            self._by_keyword = grouped
+        return self._by_keyword
+
+    def filter_rows(self, keyword=None, category=None):
+        """
+        Returns the row indices for the sentence preview: grouped by keyword
+        (alphabetically), in document order within a keyword, optionally
+        restricted to one keyword and/or one category.
+        """
+        category_id = self._category_ids.get(category) if category is not None else None
+        if category is not None and category_id is None:
+            return []
+        grouped = self.rows_by_keyword()
+        keywords = [keyword] if keyword is not None else sorted(grouped)
+        rows = []
+        for kw in keywords:
+            for index in grouped.get(kw, ()):
+                if category_id is None or self.category_id[index] == category_id:
+                    rows.append(index)
+        return rows
+
+    def replace_sentences(self, starts, other):
+        """
+        Returns a new table with the rows of this one, except those of the
+        sentences whose document offset is in starts, merged in document
+        order with every row of other (e.g. those sentences matched again).
+        Rows are copied with their match offsets; nothing is matched again.
+        """
+        merged = ContextTable()
+        kept = (
+            (self.sentence_starts[sentence_id], 0, sentence_id)
+            for sentence_id in range(len(self.sentences))
+            if self.sentence_starts[sentence_id] not in starts
+        )
+        added = ((other.sentence_starts[sentence_id], 1, sentence_id) for sentence_id in range(len(other.sentences)))
+        rows_by_table = (self._rows_by_sentence(), other._rows_by_sentence())
+        for start, source, sentence_id in sorted(list(kept) + list(added)):
+            table = other if source else self
+            merged_id = merged.add_sentence(table.sentences[sentence_id], start)
+            for index in rows_by_table[source].get(sentence_id, ()):
+                merged._append(
+                    table.page[index], merged_id,
+                    table.keywords[table.keyword_id[index]],
+                    table.categories[table.category_id[index]],
+                    table.forms[table.form_id[index]],
+                    table.row_offsets(index),
+                )
+        return merged
+
+    def counts(self):
+        """Returns (stats, keyword_counts): rows per category and per keyword."""
+        stats = defaultdict(int)
+        keyword_counts = defaultdict(int)
+        for keyword_id, category_id in zip(self.keyword_id, self.category_id):
+            stats[self.categories[category_id]] += 1
+            keyword_counts[self.keywords[keyword_id]] += 1
+        return stats, keyword_counts
+
+    def form_counts(self):
+        """Returns {keyword: {surface form: count}}, i.e. how each concept was spelled in the text."""
+        counts = {}
+        for keyword_id, form_id in zip(self.keyword_id, self.form_id):
+            forms = counts.setdefault(self.keywords[keyword_id], {})
+            form = self.forms[form_id]
+            forms[form] = forms.get(form, 0) + 1
+        return counts
+
+    def to_records(self):
+        """Returns the rows as a list of {page, sentence, keyword, category} dicts (e.g. for JSON)."""
+        return [row.to_dict() for row in self]
+
+    def row_offsets(self, index):
+        """Returns the (start, end) positions of row index's keyword in its sentence."""
+        first = self.offset_start[index] * 2
+        last = self.offset_start[index + 1] * 2 if index + 1 < len(self) else len(self.match_offsets)
+        offsets = self.match_offsets[first:last]
+        return list(zip(offsets[::2], offsets[1::2]))
+
+    def _rows_by_sentence(self):
+        rows = {}
+        for index, sentence_id in enumerate(self.sentence_id):
+            rows.setdefault(sentence_id, []).append(index)
+        return rows
+
+    @staticmethod
+    def _intern(value, values, ids):
+        value_id = ids.get(value)
+        if value_id is None:
+            value_id = ids[value] = len(values)
+            values.append(value)
+        return value_id
+
+class ContextRow:
+    """Read-only view of one ContextTable row; supports row.keyword and row["keyword"]."""
+    __slots__ = ("_table", "_index")
+
+    FIELDS = ("page", "sentence", "keyword", "category")
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    @property
+    def page(self):
+        return self._table.page[self._index]
+
+    @property
+    def sentence(self):
+        return self._table.sentences[self._table.sentence_id[self._index]]
+
+    @property
+    def keyword(self):
+        return self._table.keywords[self._table.keyword_id[self._index]]
+
+    @property
+    def category(self):
+        return self._table.categories[self._table.category_id[self._index]]
+
+    @property
+    def form(self):
+        return self._table.forms[self._table.form_id[self._index]]
+
+    @property
+    def snippet(self):
+        """Preview HTML: the keyword highlighted in a window of its sentence (rendered on each access)."""
+        return make_snippet(self.sentence, self._table.row_offsets(self._index))
+
+    def __getitem__(self, field):
+        if field not in self.FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self):
+        return f"ContextRow({self.to_dict()!r})"
@@ -0,0 +1,207 @@
+import os
+from array import array
+
+import numpy as np
+
+from batch import read_results
+
+# Ways to make papers of different lengths comparable in KeywordCorpus.scores
+NORMALIZATIONS = (None, "share", "tfidf")
+
+class KeywordCorpus:
+    """
+    Sparse papers x keywords matrix of keyword counts, for comparing many
+    papers at once ("which papers mention limitations most").
+    Columns are the keywords of a flattened keyword map (see
+    utils.get_flattened_keywords); rows are papers, added incrementally
+    from their keyword_counts, so papers are never rescanned. Nonzero
+    counts are appended to flat (row, column, count) arrays and every
+    query is a handful of vectorized NumPy passes over them.
+    """
+    def __init__(self, keyword_map):
+        self.keywords = list(keyword_map)
+        self.categories = sorted(set(keyword_map.values()))
+        self._columns = {kw: i for i, kw in enumerate(self.keywords)}
+        self._category_ids = {c: i for i, c in enumerate(self.categories)}
+        # Category index of every column, for the category roll-up
+        self._column_category = np.array([self._category_ids[keyword_map[kw]] for kw in self.keywords], dtype=np.int64)
+        self.papers = []
+        self._paper_ids = {}
+        self._rows = array("I")
+        self._cols = array("I")
+        self._counts = array("I")
+
+    def __len__(self):
+        return len(self.papers)
+
+    def __contains__(self, paper):
+        return paper in self._paper_ids
+
+    def add_paper(self, paper, keyword_counts):
+        """
+        Adds one paper's row from its {keyword: count} dict. Keywords outside
+        the vocabulary (e.g. custom ones) are ignored.
+        Returns:
+            - the paper's row index
+        """
+        if paper in self._paper_ids:
+            raise ValueError(f"Paper already in the corpus: {paper}")
+        row = len(self.papers)
+        self.papers.append(paper)
+        self._paper_ids[paper] = row
+        for keyword, count in keyword_counts.items():
+            col = self._columns.get(keyword)
+            if col is not None and count:
+                self._rows.append(row)
+                self._cols.append(col)
+                self._counts.append(count)
+        return row
+
+    def add_results(self, results_path):
+        """
+        Adds every successfully analyzed paper of a batch results JSONL file
+        (see batch.run_batch) that is not in the corpus yet. A paper recorded
+        twice keeps its last record.
+        Returns:
+            - number of papers added
+        """
+        records = {}
+        for record in read_results(results_path):
+            if "error" not in record and "keyword_counts" in record:
+                records[record["file"]] = record["keyword_counts"]
+        added = 0
+        for paper, keyword_counts in records.items():
+            if paper not in self._paper_ids:
+                self.add_paper(paper, keyword_counts)
+                added += 1
+        return added
+
+    def coo(self):
+        """Returns the matrix as (rows, columns, counts) NumPy arrays of its nonzero entries."""
+        return (
+            np.frombuffer(self._rows, dtype=np.uint32).astype(np.int64),
+            np.frombuffer(self._cols, dtype=np.uint32).astype(np.int64),
+            np.frombuffer(self._counts, dtype=np.uint32).astype(np.float64),
+        )
+
+    def to_dense(self):
+        """Returns the full papers x keywords count matrix (only sensible for small corpora)."""
+        rows, cols, counts = self.coo()
+        dense = np.zeros((len(self.papers), len(self.keywords)))
+        dense[rows, cols] = counts
+        return dense
+
+    def paper_totals(self):
+        """Returns the total number of keyword matches of every paper."""
+        rows, _, counts = self.coo()
+        return np.bincount(rows, weights=counts, minlength=len(self.papers))
+
+    def keyword_totals(self):
+        """Returns {keyword: total count over the corpus}."""
+        _, cols, counts = self.coo()
+        totals = np.bincount(cols, weights=counts, minlength=len(self.keywords))
+        return dict(zip(self.keywords, totals.astype(np.int64).tolist()))
+
+    def category_matrix(self):
+        """Returns the papers x categories matrix (columns in self.categories order)."""
+        rows, cols, counts = self.coo()
+        n_categories = len(self.categories)
+        flat = rows * n_categories + self._column_category[cols]
+        rolled = np.bincount(flat, weights=counts, minlength=len(self.papers) * n_categories)
+        return rolled.reshape(len(self.papers), n_categories)
+
+    def scores(self, keyword=None, category=None, normalize=None):
+        """
+        Returns one score per paper for a keyword or a category:
+            normalize=None     raw counts
+            normalize="share"  fraction of the paper's keyword matches
+            normalize="tfidf"  counts weighted by log(papers / papers mentioning it),
+                               so keywords every paper uses count for little
+        """
+        if (keyword is None) == (category is None):
+            raise ValueError("Pass exactly one of keyword or category")
+        if normalize not in NORMALIZATIONS:
+            raise ValueError(f"Unknown normalization: {normalize} (expected one of {NORMALIZATIONS})")
+        rows, cols, counts = self.coo()
+
+        if normalize == "tfidf":
+            papers_with = np.bincount(cols, minlength=len(self.keywords))
+            idf = np.log((1 + len(self.papers)) / (1 + papers_with)) + 1
+            counts = counts * idf[cols]
+
+        if keyword is not None:
+            col = self._columns.get(keyword)
+            if col is None:
+                raise KeyError(keyword)
+            mask = cols == col
+        else:
+            category_id = self._category_ids.get(category)
+            if category_id is None:
+                raise KeyError(category)
+            mask = self._column_category[cols] == category_id
+        scores = np.bincount(rows[mask], weights=counts[mask], minlength=len(self.papers))
+
+        if normalize == "share":
+            totals = self.paper_totals()
+            scores = np.divide(scores, totals, out=np.zeros_like(scores), where=totals > 0)
+        return scores
+
+    def rank(self, keyword=None, category=None, normalize=None, top=10):
+        """
+        Returns the top papers for a keyword or a category as [(paper, score), ...],
+        best first. Only the top entries are sorted, so ranking 10k papers stays cheap.
+        """
+        scores = self.scores(keyword, category, normalize)
+        top = min(top, len(scores))
+        if top <= 0:
+            return []
+        best = np.argpartition(-scores, top - 1)[:top]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(self.papers[i], float(scores[i])) for i in best if scores[i] > 0]
+
+    def save(self, path):
+        """Stores the corpus as a compressed .npz file, to be extended later without rereading results."""
+        rows, cols, counts = self.coo()
+        keyword_categories = [self.categories[c] for c in self._column_category.tolist()]
+        np.savez_compressed(
+            path,
+            keywords=np.array(self.keywords, dtype=str),
+            keyword_categories=np.array(keyword_categories, dtype=str),
+            papers=np.array(self.papers, dtype=str),
+            rows=rows.astype(np.uint32),
+            cols=cols.astype(np.uint32),
+            counts=counts.astype(np.uint32),
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Loads a corpus written by save()."""
+        with np.load(path) as data:
+            corpus = cls(dict(zip(data["keywords"].tolist(), data["keyword_categories"].tolist())))
+            for paper in data["papers"].tolist():
+                corpus._paper_ids[paper] = len(corpus.papers)
+                corpus.papers.append(paper)
+            corpus._rows.frombytes(data["rows"].astype(np.uint32).tobytes())
+            corpus._cols.frombytes(data["cols"].astype(np.uint32).tobytes())
+            corpus._counts.frombytes(data["counts"].astype(np.uint32).tobytes())
+        return corpus
+
+def build_corpus(results_path, keyword_map, matrix_path=None):
+    """
+    Builds the keyword matrix of a batch results file. With matrix_path,
+    an existing matrix is loaded and only the papers it does not contain
+    yet are added before it is saved back.
+    Returns:
+        - (KeywordCorpus, number of papers added)
+    """
+    if matrix_path is not None and os.path.exists(matrix_path):
+        corpus = KeywordCorpus.load(matrix_path)
+        keyword_categories = [corpus.categories[c] for c in corpus._column_category.tolist()]
+        if dict(zip(corpus.keywords, keyword_categories)) != keyword_map:
+            raise ValueError(f"{matrix_path} was built with different keywords; remove it to rebuild")
+    else:
+        corpus = KeywordCorpus(keyword_map)
+    added = corpus.add_results(results_path)
+    if matrix_path is not None and added:
+        corpus.save(matrix_path)
+    return corpus, added
@@ -0,0 +1,181 @@
+from bisect import bisect_right
+
+# Placed between text blocks so a phrase never matches across columns or
+# separate paragraphs (the matcher only joins words separated by whitespace).
+BLOCK_SEPARATOR = " \x00 "
+# Horizontal gap, in line heights, up to which highlights on a line count as touching (a word space is about 0.25)
+MERGE_GAP = 0.5
+
+def build_word_stream(words):
+    """
+    Joins the words of a page (as returned by page.get_text("words")) into
+    one string for the keyword matcher. A word hyphenated at the end of a
+    line ("implemen-" + "tation") is joined back together, like
+    segmenter.clean_page_text does for the page text.
+    Returns:
+        - stream: the joined text
+        - starts: offset of each word in the stream, in word order
+        - ends: end offset of each word in the stream
+    """
+    parts = []
+    starts = []
+    ends = []
+    pos = 0
+    joined = False
+    for i, word in enumerate(words):
+        if parts and not joined:
+            sep = BLOCK_SEPARATOR if word[5] != words[i - 1][5] else " "
+            parts.append(sep)
+            pos += len(sep)
+        text = word[4]
+        joined = _is_line_end_hyphenation(words, i)
+        if joined:
+            text = text[:-1]
+        starts.append(pos)
+        parts.append(text)
+        pos += len(text)
+        ends.append(pos)
+    return "".join(parts), starts, ends
+
+def _is_line_end_hyphenation(words, i):
+    word = words[i]
+    if i + 1 >= len(words) or len(word[4]) < 2:
+        return False
+    following = words[i + 1]
+    return (
+        word[4].endswith("-") and word[4][-2].islower()
+        and following[4][:1].islower()
+        and following[5] == word[5] and following[6] != word[6]
+    )
+
+def match_rects(words, starts, ends, start, end):
+    """
+    Converts a match at stream offsets [start, end) into highlight rects,
+    one per text line the match touches. Words only partly covered by the
+    match (e.g. "model," for "model") are trimmed proportionally.
+    """
+    first = bisect_right(starts, start) - 1
+    last = bisect_right(starts, end - 1) - 1
+    rects = []
+    current_line = None
+    for i in range(first, last + 1):
+        x0, y0, x1, y1, _, block_no, line_no = words[i][:7]
+        length = ends[i] - starts[i]
+        lo = max(start - starts[i], 0)
+        hi = min(end - starts[i], length)
+        if lo > 0 or hi < length:
+            width = (x1 - x0) / len(words[i][4])
+            x0, x1 = x0 + width * lo, x0 + width * hi
+        line = (block_no, line_no)
+        if line == current_line:
+            rect = rects[-1]
+            rects[-1] = (min(rect[0], x0), min(rect[1], y0), max(rect[2], x1), max(rect[3], y1))
+        else:
+            rects.append((x0, y0, x1, y1))
+            current_line = line
+    return rects
+
+def page_highlights(page, matcher):
+    """
+    Finds every keyword on a page with one word extraction and one matcher
+    pass, independent of the number of keywords.
+    Returns:
+        - list of (keyword, category, rects) with rects as (x0, y0, x1, y1) tuples
+    """
+    words = page.get_text("words")
+    if not words:
+        return []
+    stream, starts, ends = build_word_stream(words)
+    return [
+        (kw, category, match_rects(words, starts, ends, start, end))
+        for start, end, kw, category in matcher.finditer(stream)
+    ]
+
+def merge_highlights(page_matches):
+    """
+    Merges the highlights of a page into as few annotations as possible.
+    Rects of the same category on the same line that overlap or touch (at
+    most MERGE_GAP line heights apart, about a word space) become one rect,
+    and matches joined that way, also through the other lines of a
+    multi-line match, share one multi-quad annotation. Where rects of
+    different categories overlap, the longest match keeps its highlight
+    and the other match is dropped.
+    Returns:
+        - list of (keywords, category, rects): keywords of the merged matches
+          in reading order without repeats, rects one per merged run on
+          each line; in reading order of the first match
+    """
+    if not page_matches:
+        return []
+
+    # Group every rect into a text line by its vertical center
+    pieces = sorted(
+        ((rect[1] + rect[3]) / 2, i, rect)
+        for i, (_, _, rects) in enumerate(page_matches)
+        for rect in rects
+    )
+    line_of = {}
+    line = -1
+    band_bottom = None
+    for center, i, rect in pieces:
+        if band_bottom is None or center > band_bottom:
+            line += 1
+            band_bottom = rect[3]
+        line_of[(i, rect)] = line
+
+    # Longest match first, so it wins overlaps with other categories
+    kept_by_line = {}
+    order = sorted(range(len(page_matches)), key=lambda i: -sum(rect[2] - rect[0] for rect in page_matches[i][2]))
+    for i in order:
+        _, category, rects = page_matches[i]
+        if any(
+            other_category != category and rect[0] < other[2] and other[0] < rect[2]
+            for rect in rects
+            for other, other_category, _ in kept_by_line.get(line_of[(i, rect)], ())
+        ):
+            continue
+        for rect in rects:
+            kept_by_line.setdefault(line_of[(i, rect)], []).append((rect, category, i))
+
+    # Merge touching rects per line and category; matches sharing a run end up in one group
+    parent = {}
+
+    def find(i):
+        while parent.setdefault(i, i) != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    runs = []
+    for line in sorted(kept_by_line):
+        by_category = {}
+        for rect, category, i in kept_by_line[line]:
+            by_category.setdefault(category, []).append((rect, i))
+        for category, members in by_category.items():
+            members.sort(key=lambda member: member[0][0])
+            run, run_matches = list(members[0][0]), [members[0][1]]
+            for rect, i in members[1:]:
+                gap = MERGE_GAP * max(rect[3] - rect[1], run[3] - run[1])
+                if rect[0] - run[2] <= gap:
+                    run = [run[0], min(run[1], rect[1]), max(run[2], rect[2]), max(run[3], rect[3])]
+                    run_matches.append(i)
+                else:
+                    runs.append((line, tuple(run), run_matches))
+                    run, run_matches = list(rect), [i]
+            runs.append((line, tuple(run), run_matches))
+    for _, _, run_matches in runs:
+        for i in run_matches[1:]:
+            parent[find(i)] = find(run_matches[0])
+
+    groups = {}
+    for line, run, run_matches in runs:
+        group = groups.setdefault(find(run_matches[0]), {"matches": set(), "runs": []})
+        group["matches"].update(run_matches)
+        group["runs"].append((line, run[0], run))
+    merged = []
+    for group in sorted(groups.values(), key=lambda group: min(group["matches"])):
+        first = min(group["matches"])
+        keywords = list(dict.fromkeys(page_matches[i][0] for i in sorted(group["matches"])))
+        rects = [run for _, _, run in sorted(group["runs"])]
+        merged.append((keywords, page_matches[first][1], rects))
+    return merged
@@ -0,0 +1,119 @@
+from bisect import bisect_left, bisect_right
+
+from context import ContextTable
+from matcher import TOKEN, get_matcher, normalize_keyword
+from processor import add_sentence_matches
+from stemmer import stem
+
+def keyword_diff(previous_map, keyword_map):
+    """
+    Finds the keywords whose matches can differ between two keyword maps:
+    those added, removed or moved to another category, plus every keyword
+    that shares a word stem with one of them (directly or through another
+    such keyword). Matches only compete with matches of overlapping words,
+    so the matches of all other keywords are unchanged.
+    Returns:
+        - (keywords, stems, literal): the affected keywords of both maps,
+          their word stems, and the affected keywords without any word
+          characters (e.g. "=") that only a full scan can find
+    """
+    changed = {kw for kw in previous_map if keyword_map.get(kw) != previous_map[kw]}
+    changed.update(kw for kw in keyword_map if previous_map.get(kw) != keyword_map[kw])
+
+    keyword_stems = {}
+    for kw in set(previous_map) | set(keyword_map):
+        keyword_stems[kw] = {stem(word) for word in TOKEN.findall(normalize_keyword(kw))}
+
+    keywords = set(changed)
+    stems = set()
+    for kw in keywords:
+        stems |= keyword_stems[kw]
+    grown = True
+    while grown:
+        grown = False
+        for kw, kw_stems in keyword_stems.items():
+            if kw not in keywords and kw_stems & stems:
+                keywords.add(kw)
+                stems |= kw_stems
+                grown = True
+    literal = {kw for kw in keywords if not keyword_stems[kw]}
+    return keywords, stems, literal
+
+def affected_sentences(search_index, stems, literal=()):
+    """
+    Returns the ids of the indexed sentences that contain one of the stems,
+    in document order. Keywords in literal have no words to look up, so
+    they make every sentence affected.
+    """
+    if literal:
+        return list(range(len(search_index)))
+    sentence_ids = set()
+    for term in stems:
+        entries = search_index.postings.get(term)
+        if entries is not None:
+            sentence_ids.update(entries[0::3])
+    return sorted(sentence_ids)
+
+def affected_pages(search_index, sentence_ids):
+    """Returns the 0-based pages the given sentences are printed on, in order."""
+    page_starts = search_index.page_starts
+    pages = set()
+    for sentence_id in sentence_ids:
+        first = search_index.pages[sentence_id] - 1
+        last = bisect_right(page_starts, search_index.ends[sentence_id] - 1) - 1
+        pages.update(range(first, last + 1))
+    return sorted(pages)
+
+def update_context(context_data, search_index, keyword_map, sentence_ids):
+    """
+    Rematches the given sentences with keyword_map and returns a new
+    ContextTable: their rows are replaced by the new matches, every other
+    row is kept as it is, in document order.
+    """
+    matcher = get_matcher(keyword_map)
+    rematched = ContextTable()
+    for sentence_id in sentence_ids:
+        sentence = search_index.sentence(sentence_id)
+        matches = _match_sentence(matcher, search_index, sentence_id)
+        if matches:
+            add_sentence_matches(rematched, search_index.pages[sentence_id], sentence, matches, search_index.starts[sentence_id])
+    replaced = {search_index.starts[sentence_id] for sentence_id in sentence_ids}
+    return context_data.replace_sentences(replaced, rematched)
+
+def _match_sentence(matcher, search_index, sentence_id):
+    # A full run matches each page on its own, so a sentence running over a
+    # page break is matched page by page too (no phrase spans the break)
+    start, end = search_index.starts[sentence_id], search_index.ends[sentence_id]
+    page_starts = search_index.page_starts
+    bounds = [start, *page_starts[bisect_right(page_starts, start):bisect_left(page_starts, end)], end]
+    matches = []
+    for segment_start, segment_end in zip(bounds, bounds[1:]):
+        offset = segment_start - start
+        for match_start, match_end, kw, category in matcher.find_all(search_index.text[segment_start:segment_end]):
+            matches.append((match_start + offset, match_end + offset, kw, category))
+    return matches
+
+def update_result(result, previous_map, keyword_map):
+    """
+    Turns the analysis result of one keyword map into that of another
+    without the PDF: only sentences with an affected keyword (see
+    keyword_diff) are matched again, against the text kept in the result's
+    search index. Triage, citations and the search index do not depend on
+    the keywords and are reused.
+    Returns:
+        - (result, affected keywords, affected sentence ids)
+    """
+    search_index = result["search_index"]
+    keywords, stems, literal = keyword_diff(previous_map, keyword_map)
+    sentence_ids = affected_sentences(search_index, stems, literal)
+    context_data = update_context(result["context_data"], search_index, keyword_map, sentence_ids)
+    stats, keyword_counts = context_data.counts()
+    updated = dict(
+        result,
+        stats=stats,
+        keyword_counts=keyword_counts,
+        keyword_forms=context_data.form_counts(),
+        context_data=context_data,
+        highlighted_pdf=None,
+    )
+    return updated, keywords, sentence_ids
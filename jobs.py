@@ -0,0 +1,256 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz
+
+import parallel
+import perf
+import pipeline
+import processor
+from cache import cache_key, hash_pdf
+
+# Analyses that run at once per server process; the rest wait in the queue
+DEFAULT_JOB_WORKERS = int(os.environ.get("SKIMMATE_JOB_WORKERS", 2))
+# Analyses allowed to wait for a worker; past this, submissions are turned
+# away (JobQueueFull) instead of piling up and slowing everyone down
+DEFAULT_JOB_QUEUE = int(os.environ.get("SKIMMATE_JOB_QUEUE", 16))
+# Seconds a finished job can still be polled
+JOB_RETENTION = 600
+# Matched sentences kept per job for the live preview
+RECENT_ROWS = 8
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+# Error of a job whose upload PyMuPDF could not open
+NOT_A_PDF = "The file is not a readable PDF"
+
+class JobQueueFull(Exception):
+    """Raised by JobManager.submit when every worker is busy and the queue is full."""
+    def __init__(self, queued):
+        super().__init__(f"{queued} analyses are already waiting")
+        self.queued = queued
+
+class AnalysisJob:
+    """
+    One submitted analysis. Progress fields are updated by the worker thread;
+    read them through snapshot(), which copies them under the job's lock.
+    pdf_hash is the cache.hash_pdf digest of the paper, for later cache keys.
+    """
+    def __init__(self, key, pdf_hash=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.pdf_hash = pdf_hash
+        self.status = QUEUED
+        self.page = 0
+        self.page_count = None
+        self.stats = {}
+        self.recent = []
+        self.result = None
+        self.error = None
+        self.perf = None
+        self.subscribers = 1
+        self.submitted_at = time.monotonic()
+        self.finished_at = None
+        self.future = None
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+
+    def snapshot(self):
+        """
+        Returns:
+            - dict with id, status, page, page_count, stats, recent
+              ([(page, keyword, snippet HTML), ...] newest last), error and
+              elapsed seconds
+        """
+        with self._lock:
+            end = self.finished_at or time.monotonic()
+            return {
+                "id": self.id,
+                "status": self.status,
+                "page": self.page,
+                "page_count": self.page_count,
+                "stats": dict(self.stats),
+                "recent": list(self.recent),
+                "error": self.error,
+                "elapsed": end - self.submitted_at,
+            }
+
+    def done(self):
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        """Blocks until the job has finished; returns False on timeout."""
+        return self._finished.wait(timeout)
+
+    def _progress(self, event):
+        with self._lock:
+            self.status = RUNNING
+            self.page = event["page"]
+            self.page_count = event["page_count"]
+            self.stats = dict(event["stats"])
+            # Only the last RECENT_ROWS rows are kept, so only those snippets are rendered
+            context = event["context"]
+            for index in range(max(0, len(context) - RECENT_ROWS), len(context)):
+                row = context[index]
+                self.recent.append((row.page, row.keyword, row.snippet))
+            del self.recent[:-RECENT_ROWS]
+
+    def _finish(self, status, result=None, error=None):
+        with self._lock:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished_at = time.monotonic()
+        self._finished.set()
+
+class JobManager:
+    """
+    Server-wide queue of analyses with a bounded worker pool, so that many
+    simultaneous uploads share a fixed number of workers instead of each
+    holding a script thread for the whole analysis.
+    Identical in-flight analyses (same PDF content and keyword set) are run
+    once and shared, cached results complete without queueing, and
+    submissions beyond the queue limit raise JobQueueFull so callers can
+    back off and retry. Each analysis gets an even share of the page-level
+    worker processes (see parallel.DEFAULT_WORKERS), so the machine is not
+    oversubscribed when every job slot is busy.
+    """
+    def __init__(self, cache=None, max_workers=DEFAULT_JOB_WORKERS, max_queued=DEFAULT_JOB_QUEUE):
+        self.cache = cache
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.page_workers = max(1, parallel.DEFAULT_WORKERS // max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="skimmate-job")
+        self._jobs = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def submit(self, pdf_file, keyword_map, color_map, recorder=None):
+        """
+        Queues an analysis (see pipeline.run_analysis) and returns its
+        AnalysisJob right away. pdf_file must stay readable until the job
+        is done (bytes, or a path such as a spooled upload).
+        An identical job that is queued or running is returned instead of a
+        new one. recorder, if given, collects the stage timings of the run.
+        Raises:
+            - JobQueueFull when max_queued jobs are already waiting
+        """
+        source = processor.pdf_source(pdf_file)
+        # Hashed once per submission; the job and the pipeline reuse the digest
+        pdf_hash = hash_pdf(source)
+        key = cache_key(source, keyword_map, pdf_hash=pdf_hash)
+        with self._lock:
+            self._prune()
+            job = self._in_flight.get(key)
+            if job is not None:
+                job.subscribers += 1
+                return job
+
+        # Results already cached are served without taking a worker
+        if self.cache is not None:
+            result = self.cache.get(key)
+            if result is not None:
+                job = AnalysisJob(key, pdf_hash)
+                if recorder is not None:
+                    recorder.log(pages=None, cached=True)
+                    job.perf = recorder.summary()
+                job._finish(DONE, result=result)
+                with self._lock:
+                    self._jobs[job.id] = job
+                return job
+
+        with self._lock:
+            job = self._in_flight.get(key)
+            if job is not None:
+                job.subscribers += 1
+                return job
+            queued = self._count(QUEUED)
+            if queued >= self.max_queued:
+                raise JobQueueFull(queued)
+            job = AnalysisJob(key, pdf_hash)
+            self._jobs[job.id] = job
+            self._in_flight[key] = job
+            job.future = self._executor.submit(self._run, job, source, keyword_map, color_map, recorder)
+        return job
+
+    def get(self, job_id):
+        """Returns the job with this id, or None once it has expired."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def position(self, job):
+        """Returns how many queued jobs are ahead of job (0 when it is running or done)."""
+        with self._lock:
+            if job.status != QUEUED:
+                return 0
+            ahead = 0
+            for other in self._jobs.values():
+                if other is job:
+                    break
+                if other.status == QUEUED:
+                    ahead += 1
+            return ahead
+
+    def release(self, job):
+        """
+        Tells the manager a submitter no longer needs the job (e.g. it has
+        taken the result). A finished job nobody needs is forgotten at once,
+        and a queued one is cancelled, freeing its queue slot.
+        """
+        with self._lock:
+            job.subscribers -= 1
+            if job.subscribers > 0:
+                return
+            if job.done():
+                self._jobs.pop(job.id, None)
+            elif job.status == QUEUED and job.future is not None and job.future.cancel():
+                self._in_flight.pop(job.key, None)
+                self._jobs.pop(job.id, None)
+                job._finish(CANCELLED)
+
+    def stats(self):
+        """Returns {"queued", "running", "workers", "max_queued"}, e.g. for a status line."""
+        with self._lock:
+            return {
+                "queued": self._count(QUEUED),
+                "running": self._count(RUNNING),
+                "workers": self.max_workers,
+                "max_queued": self.max_queued,
+            }
+
+    def _run(self, job, source, keyword_map, color_map, recorder):
+        with job._lock:
+            job.status = RUNNING
+        try:
+            with perf.recording(recorder):
+                events = pipeline.iter_analysis(source, keyword_map, color_map, cache=self.cache, workers=self.page_workers, pdf_hash=job.pdf_hash)
+                for event in events:
+                    if event["stage"] == "analyze":
+                        job._progress(event)
+                    elif event["stage"] == "done":
+                        result = event["result"]
+            if recorder is not None:
+                recorder.log(pages=job.page_count, cached=job.page_count is None)
+                job.perf = recorder.summary()
+            job._finish(DONE, result=result)
+        except fitz.FileDataError:
+            # PyMuPDF's message may name a spooled temp file
+            job._finish(FAILED, error=NOT_A_PDF)
+        except Exception as e:
+            job._finish(FAILED, error=f"{type(e).__name__}: {e}")
+        finally:
+            with self._lock:
+                if self._in_flight.get(job.key) is job:
+                    del self._in_flight[job.key]
+
+    def _count(self, status):
+        return sum(1 for job in self._jobs.values() if job.status == status)
+
+    def _prune(self):
+        # Forget finished jobs nobody polled within JOB_RETENTION
+        now = time.monotonic()
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at is not None and now - j.finished_at > JOB_RETENTION]:
+            del self._jobs[job_id]
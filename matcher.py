@@ -0,0 +1,161 @@
+import re
+from functools import lru_cache
+
+from stemmer import stem, stem_token
+
+# A word of the text, and the next word of a phrase (only whitespace in between)
+TOKEN = re.compile(r"\w+")
+NEXT_TOKEN = re.compile(r"\s+(\w+)")
+
+class KeywordMatcher:
+    """
+    Finds every keyword of a keyword map in a single pass over the text.
+    Keywords and the words of the text are both reduced to stems
+    (stemmer.py), so "model" also finds "models" and "verify" finds
+    "verified" without listing every inflection, and matching is one hash
+    lookup per word of the text. The keyword reported for a match is the
+    one spelled in the map (the concept); the text itself holds the surface
+    form. Keywords only match whole words, so "model" does not match inside
+    "remodeling", and the longest keyword wins, so "simulation experiment"
+    beats "simulation". Words of a phrase may be separated by any whitespace,
+    including the line breaks PDF text is full of.
+    Keywords with non-word characters (e.g. "n =") are matched literally
+    with a regular expression instead.
+    """
+    def __init__(self, keyword_map):
+        self.keyword_map = keyword_map
+        # Stems -> keyword; of several spellings of one concept ("verify",
+        # "verified") the shortest names it. A spelling of another category
+        # takes the concept over instead of being folded into it, so a custom
+        # keyword sharing a default keyword's stems (they come last in the
+        # map) is reported as itself, under its own category.
+        concepts = {}
+        literal = {}
+        for kw in keyword_map:
+            words = normalize_keyword(kw).split(" ")
+            if not all(TOKEN.fullmatch(word) for word in words):
+                literal.setdefault(normalize_keyword(kw), kw)
+                continue
+            stems = tuple(stem(word) for word in words)
+            current = concepts.get(stems)
+            if current is None or keyword_map[kw] != keyword_map[current] or (len(kw), kw) < (len(current), current):
+                concepts[stems] = kw
+
+        # First stem -> [(stems, keyword), ...], longest phrase first
+        self._index = {}
+        for stems, kw in concepts.items():
+            self._index.setdefault(stems[0], []).append((stems, kw))
+        for entries in self._index.values():
+            entries.sort(key=lambda entry: len(entry[0]), reverse=True)
+
+        # Normalized surface form -> keyword as spelled in the map
+        self._literal = literal
+        if literal:
+            keywords = sorted(literal, key=len, reverse=True)
+            alternation = "|".join(_keyword_pattern(kw) for kw in keywords)
+            self.pattern = re.compile(alternation, re.IGNORECASE)
+        else:
+            self.pattern = None
+
+    def finditer(self, text):
+        """
+        Yields (start, end, keyword, category) for every keyword occurrence
+        in text, left to right and without overlaps.
+        """
+        matches = self._find_words(text)
+        if self.pattern is not None:
+            matches = _merge_matches(list(matches), self._find_literal(text))
+        return iter(matches)
+
+    def find_all(self, text):
+        return list(self.finditer(text))
+
+    def _find_words(self, text):
+        index = self._index
+        keyword_map = self.keyword_map
+        last_end = 0
+        for token in TOKEN.finditer(text):
+            entries = index.get(stem_token(token.group()))
+            if entries is None or token.start() < last_end:
+                continue
+            for stems, kw in entries:
+                end = _match_phrase(text, token.end(), stems)
+                if end is not None:
+                    yield token.start(), end, kw, keyword_map[kw]
+                    last_end = end
+                    break
+
+    def _find_literal(self, text):
+        matches = []
+        for match in self.pattern.finditer(text):
+            kw = self._literal[normalize_keyword(match.group())]
+            matches.append((match.start(), match.end(), kw, self.keyword_map[kw]))
+        return matches
+
+def _match_phrase(text, pos, stems):
+    """Returns the end of the phrase whose first word ends at pos, or None if the next words differ."""
+    for expected in stems[1:]:
+        following = NEXT_TOKEN.match(text, pos)
+        if following is None or stem_token(following.group(1)) != expected:
+            return None
+        pos = following.end()
+    return pos
+
+def _merge_matches(first, second):
+    """Merges two sorted match lists, keeping the leftmost (then longest) of overlapping matches."""
+    merged = []
+    last_end = 0
+    for match in sorted(first + second, key=lambda m: (m[0], -m[1])):
+        if match[0] >= last_end:
+            merged.append(match)
+            last_end = match[1]
+    return merged
+
+def group_matches_by_sentence(matches, sentence_spans):
+    """
+    Assigns matches (sorted by offset, as returned by KeywordMatcher) to the
+    (page, start, end) sentence span their start falls in. Matches between
+    sentences are dropped.
+    Returns:
+        - groups: list of (span, sentence_matches) for each sentence with a match
+        - remaining: matches after the last span (e.g. in a sentence still open)
+    """
+    groups = []
+    match_index = 0
+    for span in sentence_spans:
+        start, end = span[1], span[2]
+        # Skip matches that fell between sentences (in trimmed whitespace)
+        while match_index < len(matches) and matches[match_index][0] < start:
+            match_index += 1
+        first = match_index
+        while match_index < len(matches) and matches[match_index][0] < end:
+            match_index += 1
+        if match_index > first:
+            groups.append((span, matches[first:match_index]))
+    return groups, matches[match_index:]
+
+def normalize_keyword(text):
+    """Lowercases text and collapses runs of whitespace to single spaces."""
+    return " ".join(text.lower().split())
+
+def _keyword_pattern(kw):
+    words = kw.split(" ")
+    pattern = r"\s+".join(re.escape(word) for word in words)
+    # Only guard the ends that are word characters, so keywords like "n ="
+    # still match when followed by a number or a space.
+    if re.match(r"\w", kw):
+        pattern = r"(?<!\w)" + pattern
+    if re.search(r"\w$", kw):
+        pattern = pattern + r"(?!\w)"
+    return pattern
+
+@lru_cache(maxsize=32)
+def _cached_matcher(items):
+    return KeywordMatcher(dict(items))
+
+def get_matcher(keyword_map):
+    """
+    Returns a compiled KeywordMatcher for keyword_map, reusing the one built
+    for an identical map earlier.
+    """
+    return _cached_matcher(tuple(sorted(keyword_map.items())))
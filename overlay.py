@@ -0,0 +1,185 @@
+import json
+import xml.etree.ElementTree as ET
+
+import fitz
+
+import perf
+from highlighter import merge_highlights, page_highlights
+from matcher import get_matcher
+from processor import ANNOTATION_AUTHOR, KEYWORD_SEPARATOR
+
+# Bump when the overlay layout changes; apply_overlay rejects other versions
+OVERLAY_VERSION = 2
+# Decimals kept for rect coordinates (1/100 pt is far below anything visible)
+RECT_DECIMALS = 2
+XFDF_NAMESPACE = "http://ns.adobe.com/xfdf/"
+OVERLAY_FORMATS = ("json", "xfdf")
+
+def build_overlay(doc, keyword_map, color_map, document=None, highlights=None):
+    """
+    Collects the highlights of a ParsedDocument as an annotation overlay:
+    the rects, keywords and category of every annotation (touching
+    matches merged as in processor.iter_highlight_pdf) plus one color per
+    category, instead of an annotated copy of the PDF. It is a few
+    kilobytes per paper and can be applied to the original later
+    (apply_overlay) or exported for other viewers (to_xfdf).
+    document is an identifier of the PDF that apply_overlay checks
+    (defaults to doc.pdf_hash). highlights works as in processor.iter_highlight_pdf.
+    Returns:
+        - dict {"version", "document", "colors": {category: [r, g, b]},
+          "pages": [{"page", "width", "height", "matrix", "highlights":
+          [{"keywords", "category", "rects": [[x0, y0, x1, y1], ...]}]}]}
+          with 0-based page numbers, PyMuPDF page coordinates, and matrix
+          mapping them to PDF user space; pages without matches are left out
+    """
+    matcher = get_matcher(keyword_map)
+    pages = []
+    categories = set()
+    for page_num, page in enumerate(doc.fitz_doc):
+        with perf.stage("overlay"):
+            if highlights is not None and highlights[page_num] is not None:
+                page_matches = highlights[page_num]
+            else:
+                page_matches = page_highlights(page, matcher)
+            if not page_matches:
+                continue
+            entries = []
+            for keywords, category, rects in merge_highlights(page_matches):
+                categories.add(category)
+                entries.append({
+                    "keywords": keywords,
+                    "category": category,
+                    "rects": [[round(v, RECT_DECIMALS) for v in rect] for rect in rects],
+                })
+            pages.append({
+                "page": page_num,
+                "width": round(page.rect.width, RECT_DECIMALS),
+                "height": round(page.rect.height, RECT_DECIMALS),
+                "matrix": [round(v, RECT_DECIMALS) for v in ~page.transformation_matrix],
+                "highlights": entries,
+            })
+    return {
+        "version": OVERLAY_VERSION,
+        "document": document if document is not None else doc.pdf_hash,
+        "colors": {category: list(color_map.get(category, (1, 1, 0))) for category in sorted(categories)},
+        "pages": pages,
+    }
+
+def apply_overlay(fitz_doc, overlay):
+    """
+    Adds the highlights of an overlay to an open PyMuPDF document, labelled
+    like the annotations of processor.highlight_pdf. No text is extracted
+    or matched, and the annotation objects (with a small appearance stream
+    each) are written directly instead of through PyMuPDF's per-annotation
+    update, which dominates the cost of highlighting from scratch.
+    Returns:
+        - number of annotations added
+    Raises:
+        - ValueError for an overlay of another version or with pages the document does not have
+    """
+    if overlay.get("version") != OVERLAY_VERSION:
+        raise ValueError(f"Unsupported overlay version: {overlay.get('version')} (expected {OVERLAY_VERSION})")
+    colors = overlay["colors"]
+    # One multiply-blend graphics state shared by every appearance stream, so highlights do not hide the text
+    gstate_xref = fitz_doc.get_new_xref()
+    fitz_doc.update_object(gstate_xref, "<</Type/ExtGState/BM/Multiply/CA 1/ca 1>>")
+    added = 0
+    for entry in overlay["pages"]:
+        page_num = entry["page"]
+        if not 0 <= page_num < fitz_doc.page_count:
+            raise ValueError(f"Overlay page {page_num + 1} is not in the document ({fitz_doc.page_count} pages)")
+        page = fitz_doc[page_num]
+        with perf.stage("highlighting"):
+            to_pdf = ~page.transformation_matrix
+            annot_refs = [f"{xref} 0 R" for xref, _, _ in page.annot_xrefs()]
+            for highlight in entry["highlights"]:
+                color = colors.get(highlight["category"], (1, 1, 0))
+                xref = _write_highlight(fitz_doc, page.xref, to_pdf, highlight, color, gstate_xref)
+                annot_refs.append(f"{xref} 0 R")
+                added += 1
+            fitz_doc.xref_set_key(page.xref, "Annots", "[" + " ".join(annot_refs) + "]")
+    return added
+
+def to_json(overlay):
+    return json.dumps(overlay, ensure_ascii=False, separators=(",", ":"))
+
+def to_xfdf(overlay):
+    """
+    Returns the overlay as an XFDF document, the XML annotation format
+    Acrobat and most PDF viewers import. Coordinates are converted to PDF
+    user space with each page's matrix.
+    """
+    ET.register_namespace("", XFDF_NAMESPACE)
+    root = ET.Element(f"{{{XFDF_NAMESPACE}}}xfdf")
+    annots = ET.SubElement(root, f"{{{XFDF_NAMESPACE}}}annots")
+    colors = overlay["colors"]
+    for entry in overlay["pages"]:
+        matrix = fitz.Matrix(entry["matrix"])
+        for highlight in entry["highlights"]:
+            quads = [fitz.Rect(rect) * matrix for rect in highlight["rects"]]
+            bounds = fitz.Rect(quads[0])
+            coords = []
+            for quad in quads:
+                bounds |= quad
+                # Quad points in PDF space: upper left, upper right, lower left, lower right
+                coords.extend((quad.x0, quad.y1, quad.x1, quad.y1, quad.x0, quad.y0, quad.x1, quad.y0))
+            annot = ET.SubElement(annots, f"{{{XFDF_NAMESPACE}}}highlight", {
+                "page": str(entry["page"]),
+                "rect": _format_numbers(bounds),
+                "coords": _format_numbers(coords),
+                "color": _hex_color(colors.get(highlight["category"], (1, 1, 0))),
+                "title": ANNOTATION_AUTHOR,
+                "subject": highlight["category"],
+                "flags": "print",
+            })
+            ET.SubElement(annot, f"{{{XFDF_NAMESPACE}}}contents").text = KEYWORD_SEPARATOR.join(highlight["keywords"])
+    return '<?xml version="1.0" encoding="UTF-8"?>\n' + ET.tostring(root, encoding="unicode")
+
+def save_overlay(overlay, path, overlay_format="json"):
+    """Writes an overlay as JSON (which load_overlay reads back) or XFDF."""
+    if overlay_format not in OVERLAY_FORMATS:
+        raise ValueError(f"Unknown overlay format: {overlay_format} (expected one of {OVERLAY_FORMATS})")
+    content = to_xfdf(overlay) if overlay_format == "xfdf" else to_json(overlay)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return path
+
+def load_overlay(path):
+    """Reads a JSON overlay written by save_overlay."""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def _write_highlight(fitz_doc, page_xref, to_pdf, highlight, color, gstate_xref):
+    # A /Highlight annotation in PDF user space, with its appearance as filled quads
+    quads = [fitz.Rect(rect) * to_pdf for rect in highlight["rects"]]
+    bounds = fitz.Rect(quads[0])
+    quad_points = []
+    fills = []
+    for quad in quads:
+        bounds |= quad
+        quad_points.extend((quad.x0, quad.y1, quad.x1, quad.y1, quad.x0, quad.y0, quad.x1, quad.y0))
+        fills.append(f"{_pdf_numbers(quad.top_left)} {quad.width:.{RECT_DECIMALS}f} {quad.height:.{RECT_DECIMALS}f} re")
+    rect = _pdf_numbers(bounds)
+    rgb = _pdf_numbers(color)
+
+    appearance_xref = fitz_doc.get_new_xref()
+    fitz_doc.update_object(appearance_xref, f"<</Type/XObject/Subtype/Form/BBox[{rect}]/Resources<</ExtGState<</H {gstate_xref} 0 R>>>>>>")
+    fitz_doc.update_stream(appearance_xref, f"/H gs {rgb} rg {' '.join(fills)} f".encode("ascii"))
+
+    xref = fitz_doc.get_new_xref()
+    fitz_doc.update_object(xref, (
+        f"<</Type/Annot/Subtype/Highlight/Rect[{rect}]/QuadPoints[{_pdf_numbers(quad_points)}]"
+        f"/C[{rgb}]/F 4/P {page_xref} 0 R/AP<</N {appearance_xref} 0 R>>"
+        f"/T{fitz.get_pdf_str(ANNOTATION_AUTHOR)}/Subj{fitz.get_pdf_str(highlight['category'])}"
+        f"/Contents{fitz.get_pdf_str(KEYWORD_SEPARATOR.join(highlight['keywords']))}>>"
+    ))
+    return xref
+
+def _pdf_numbers(values):
+    return " ".join(f"{v:.{RECT_DECIMALS}f}" for v in values)
+
+def _format_numbers(values):
+    return ",".join(f"{v:.{RECT_DECIMALS}f}" for v in values)
+
+def _hex_color(color):
+    return "#" + "".join(f"{round(c * 255):02X}" for c in color)
@@ -0,0 +1,100 @@
+import fitz  # PyMuPDF
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import perf
+import processor
+from highlighter import page_highlights
+from matcher import get_matcher
+from segmenter import clean_page_text
+
+# Number of worker processes (defaults to one per core)
+DEFAULT_WORKERS = int(os.environ.get("SKIMMATE_WORKERS", os.cpu_count() or 1))
+# Documents with fewer pages than this are analyzed serially; below it the
+# cost of starting workers outweighs the gain.
+PARALLEL_MIN_PAGES = int(os.environ.get("SKIMMATE_PARALLEL_MIN_PAGES", 40))
+# Shards per worker, so a slow page range does not leave other workers idle
+SHARDS_PER_WORKER = 4
+
+def iter_analyze_pages(doc, keyword_map, workers=None, min_pages=None, highlights=None):
+    """
+    Extracts keyword sentences from a (lazily parsed) ParsedDocument, sharding
+    pages across a process pool when the document is large enough.
+    Page text extracted by the workers is added to doc, and their highlight
+    rects are stored in highlights (a list with one slot per page) when given,
+    for processor.highlight_pdf to reuse.
+    Yields:
+        - (page_num, stats, keyword_counts, context) for each page, in page order
+    """
+    workers = DEFAULT_WORKERS if workers is None else workers
+    min_pages = PARALLEL_MIN_PAGES if min_pages is None else min_pages
+
+    if workers <= 1 or doc.page_count < min_pages:
+        yield from processor.iter_sentences_with_keywords(doc, keyword_map)
+        return
+
+    # Workers do the heavy per-page work (text and word extraction, matching);
+    # sentences are segmented here since they can run across shard boundaries.
+    carry = []
+
+    shards = shard_pages(doc.page_count, workers * SHARDS_PER_WORKER)
+    # Workers open the document by path, so the bytes are not pickled per
+    # shard; documents opened from memory are written to a temp file first
+    path = doc.path
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        with os.fdopen(fd, "wb") as f:
+            f.write(doc.pdf_bytes)
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards))) as pool:
+            # map returns shard results in submission order, as each becomes ready
+            shard_results = pool.map(
+                _analyze_shard,
+                [path] * len(shards),
+                [keyword_map] * len(shards),
+                shards,
+                [highlights is not None] * len(shards),
+            )
+            for _ in shards:
+                # Only the wait for workers is timed, not the consumer of this generator
+                with perf.stage("parallel_workers"):
+                    shard = next(shard_results)
+                for page_num, text, matches, page_matches in shard:
+                    doc.add_page_text(page_num, text)
+                    if highlights is not None:
+                        highlights[page_num] = page_matches
+                    with perf.stage("keyword_matching"):
+                        page_stats, page_counts, page_context, carry = processor.analyze_page(doc, page_num, matches, carry)
+                    yield page_num, page_stats, page_counts, page_context
+    finally:
+        if path != doc.path:
+            os.remove(path)
+
+def shard_pages(page_count, shard_count):
+    """Splits range(page_count) into at most shard_count contiguous (start, stop) ranges."""
+    shard_count = max(1, min(shard_count, page_count))
+    size, extra = divmod(page_count, shard_count)
+    shards = []
+    start = 0
+    for i in range(shard_count):
+        stop = start + size + (1 if i < extra else 0)
+        shards.append((start, stop))
+        start = stop
+    return shards
+
+def _analyze_shard(path, keyword_map, page_range, with_highlights=True):
+    """
+    Worker entry point: opens the document from path and analyzes a range of pages.
+    Returns a list of (page_num, cleaned text, keyword matches in the text,
+    highlights) per page; highlights is None unless with_highlights is set.
+    """
+    matcher = get_matcher(keyword_map)
+    results = []
+    with fitz.open(path) as fitz_doc:
+        for page_num in range(*page_range):
+            page = fitz_doc[page_num]
+            text = clean_page_text(page.get_text("text"))
+            page_matches = page_highlights(page, matcher) if with_highlights else None
+            results.append((page_num, text, matcher.find_all(text), page_matches))
+    return results
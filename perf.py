@@ -0,0 +1,105 @@
+import contextvars
+import json
+import logging
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger("skimmate.perf")
+
+# SKIMMATE_PERF=1 records wall and CPU time per stage; SKIMMATE_PERF=memory
+# also records allocations (through tracemalloc, which slows everything down).
+PERF_MODE = os.environ.get("SKIMMATE_PERF", "").lower()
+ENABLED = PERF_MODE not in ("", "0", "false", "off")
+TRACK_MEMORY = PERF_MODE == "memory"
+
+_current = contextvars.ContextVar("skimmate_perf_recorder", default=None)
+_NO_OP = nullcontext()
+
+class PerfRecorder:
+    """
+    Collects per-stage timings for one document.
+    Stages that run once per page (text extraction, matching, ...) are
+    summed, with calls counting how often each ran.
+    """
+    def __init__(self, document_id=None, track_memory=TRACK_MEMORY):
+        self.document_id = document_id
+        self.track_memory = track_memory
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        tracing = self.track_memory and tracemalloc.is_tracing()
+        if tracing:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            entry = self.stages.get(name)
+            if entry is None:
+                entry = self.stages[name] = {"wall": 0.0, "cpu": 0.0, "alloc_kb": 0.0, "calls": 0}
+            entry["wall"] += time.perf_counter() - wall
+            entry["cpu"] += time.thread_time() - cpu
+            entry["calls"] += 1
+            if tracing:
+                entry["alloc_kb"] = max(entry["alloc_kb"], (tracemalloc.get_traced_memory()[1] - before) / 1024)
+
+    def summary(self):
+        """Returns one row per stage in the order stages first ran."""
+        return [
+            {
+                "stage": name,
+                "wall_s": round(entry["wall"], 4),
+                "cpu_s": round(entry["cpu"], 4),
+                "peak_alloc_kb": round(entry["alloc_kb"], 1) if self.track_memory else None,
+                "calls": entry["calls"],
+            }
+            for name, entry in self.stages.items()
+        ]
+
+    def log(self, **fields):
+        """Emits the timings as one JSON log line, for scraping."""
+        record = {"event": "skimmate.perf", "document": self.document_id}
+        record.update(fields)
+        record["total_wall_s"] = round(sum(entry["wall"] for entry in self.stages.values()), 4)
+        record["stages"] = self.summary()
+        logger.info(json.dumps(record))
+
+def configure_logging(level=logging.INFO):
+    """Sends perf log lines to stderr unless the host application already routes them."""
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(level)
+
+@contextmanager
+def recording(recorder):
+    """Makes recorder the target of stage() calls in this thread for the duration of the block."""
+    if recorder is not None and recorder.track_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        started_tracing = True
+    else:
+        started_tracing = False
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current.reset(token)
+        if started_tracing:
+            tracemalloc.stop()
+
+def stage(name):
+    """
+    Context manager timing a stage on the active recorder.
+    A shared no-op when nothing is recording, so instrumented code costs
+    a single context variable lookup.
+    """
+    recorder = _current.get()
+    if recorder is None:
+        return _NO_OP
+    return recorder.stage(name)
@@ -0,0 +1,347 @@
+import os
+import shutil
+import tempfile
+from collections import defaultdict
+
+import incremental
+import overlay
+import parallel
+import perf
+import processor
+from cache import cache_key, hash_pdf
+from context import ContextTable
+from search import SearchIndex
+
+def run_analysis(pdf_file, keyword_map, color_map, cache=None, workers=None, highlight=False, pdf_hash=None):
+    """
+    Runs every analysis stage on a PDF, serving the result from cache when
+    the same PDF was already analyzed with the same keyword set.
+    workers is passed on to parallel.iter_analyze_pages (1 keeps the run
+    in this process). pdf_file may be bytes, a file-like object or a path;
+    paths are opened file-backed, so large PDFs are never read into memory.
+    The highlighted PDF is only generated with highlight=True; otherwise it
+    is None and highlight_document makes it when it is needed.
+    pdf_hash is cache.hash_pdf of the PDF when the caller already has it;
+    otherwise the PDF is hashed once here (only with a cache).
+    Returns:
+        - dict with stats, keyword_counts (per concept), keyword_forms
+          (per concept and surface form), context_data, triage_data,
+          citations, search_index (search.SearchIndex over every sentence)
+          and highlighted_pdf (bytes, or a file path for path inputs)
+    """
+    for event in iter_analysis(pdf_file, keyword_map, color_map, cache=cache, workers=workers, highlight=highlight, pdf_hash=pdf_hash):
+        if event["stage"] == "done":
+            return event["result"]
+
+def iter_analysis(pdf_file, keyword_map, color_map, cache=None, workers=None, highlight=False, pdf_hash=None):
+    """
+    Streaming variant of run_analysis that reports progress page by page.
+    When the cache holds an analysis of the same PDF with other keywords,
+    only what the keyword change affects is redone (see reanalyze).
+    Yields event dicts:
+        - {"stage": "analyze", "page", "page_count", "stats", "keyword_counts", "context"}
+          after each page, with running totals and that page's ContextTable
+        - {"stage": "highlight", "page", "page_count", "matches", "annotations"}
+          after each highlighted page, with that page's match count and the
+          number of annotations they were merged into (only with highlight=True)
+        - {"stage": "done", "result"} once, last (also the only event on a
+          cache hit or an incremental update)
+    """
+    source = processor.pdf_source(pdf_file)
+
+    key = None
+    if cache is not None:
+        if pdf_hash is None:
+            pdf_hash = hash_pdf(source)
+        key = cache_key(source, keyword_map, pdf_hash=pdf_hash)
+        result = cache.get(key)
+        if result is None:
+            # Same paper, other keywords: rematch only the affected sentences
+            previous_map = cache.get(_latest_key(pdf_hash, "analysis"))
+            previous = cache.get(cache_key(source, previous_map, pdf_hash=pdf_hash)) if previous_map is not None else None
+            if previous is not None:
+                result = reanalyze(source, previous, previous_map, keyword_map, cache=cache, pdf_hash=pdf_hash)
+        if result is not None:
+            if highlight:
+                result = dict(result, highlighted_pdf=highlight_document(source, keyword_map, color_map, cache=cache, pdf_hash=pdf_hash))
+            yield {"stage": "done", "result": result}
+            return
+
+    # Parse once: every stage below shares the same text and sentence spans.
+    # Pages are extracted as they are analyzed, page-parallel for large documents.
+    doc = processor.parse_pdf(source, lazy=True, pdf_hash=pdf_hash)
+    try:
+        page_count = doc.page_count
+        stats = defaultdict(int)
+        keyword_counts = defaultdict(int)
+        context_data = ContextTable()
+        # Highlight rects are only collected when the PDF is highlighted in this run
+        highlights = [None] * page_count if highlight else None
+        for page_num, page_stats, page_counts, page_context in parallel.iter_analyze_pages(doc, keyword_map, workers=workers, highlights=highlights):
+            processor.merge_page_result(stats, keyword_counts, context_data, page_stats, page_counts, page_context)
+            yield {
+                "stage": "analyze",
+                "page": page_num + 1,
+                "page_count": page_count,
+                "stats": stats,
+                "keyword_counts": keyword_counts,
+                "context": page_context,
+            }
+
+        with perf.stage("triage"):
+            triage_data = processor.generate_paper_triage(doc)
+        with perf.stage("citations"):
+            citations = processor.extract_citations(doc)
+        # Every page is extracted by now, so indexing only tokenizes the text
+        with perf.stage("search_index"):
+            search_index = SearchIndex.from_document(doc)
+
+        result = {
+            "stats": stats,
+            "keyword_counts": keyword_counts,
+            "keyword_forms": context_data.form_counts(),
+            "context_data": context_data,
+            "triage_data": triage_data,
+            "citations": citations,
+            "search_index": search_index,
+            "highlighted_pdf": None,
+        }
+        # The highlighted PDF is cached separately, under its own key
+        if cache is not None:
+            cache.put(key, result)
+            cache.put(_latest_key(pdf_hash, "analysis"), keyword_map)
+
+        # Highlighting (annotates the shared document, so it runs last)
+        if highlight:
+            for page_num, matches, annotations in processor.iter_highlight_pdf(doc, keyword_map, color_map, highlights):
+                yield {"stage": "highlight", "page": page_num + 1, "page_count": page_count, "matches": matches, "annotations": annotations}
+            highlighted_key = cache_key(source, keyword_map, "highlighted", pdf_hash=pdf_hash) if cache is not None else None
+            highlighted_pdf = _save_highlighted(doc, cache, highlighted_key)
+            result = dict(result, highlighted_pdf=highlighted_pdf)
+    finally:
+        doc.close()
+
+    yield {"stage": "done", "result": result}
+
+def reanalyze(pdf_file, result, previous_keyword_map, keyword_map, cache=None, pdf_hash=None):
+    """
+    Returns the analysis of a PDF for keyword_map, given its analysis
+    (result) for previous_keyword_map, e.g. after a category was toggled.
+    Only the sentences that contain an added, removed or overlapping
+    keyword are matched again, against the text kept in the result's
+    search index; the PDF is not reopened. With a cache, the new result is
+    looked up and stored like run_analysis does. pdf_file is only hashed
+    for the cache keys, and not at all when pdf_hash is given.
+    """
+    key = None
+    if cache is not None:
+        if pdf_hash is None:
+            pdf_hash = hash_pdf(processor.pdf_source(pdf_file))
+        key = cache_key(None, keyword_map, pdf_hash=pdf_hash)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    with perf.stage("incremental_analysis"):
+        updated, _, _ = incremental.update_result(result, previous_keyword_map, keyword_map)
+    if cache is not None:
+        cache.put(key, updated)
+        cache.put(_latest_key(pdf_hash, "analysis"), keyword_map)
+    return updated
+
+def result_record(result, include_context=False):
+    """
+    Returns the JSON-serializable part of a run_analysis result, as written
+    by the batch command and the HTTP service: stats, keyword_counts,
+    keyword_forms, triage, citations, the number of matches and, with
+    include_context, every matched sentence.
+    """
+    record = {
+        "stats": result["stats"],
+        "keyword_counts": result["keyword_counts"],
+        "keyword_forms": result["keyword_forms"],
+        "triage": result["triage_data"],
+        "citations": result["citations"],
+        "matches": len(result["context_data"]),
+    }
+    if include_context:
+        record["context"] = result["context_data"].to_records()
+    return record
+
+def highlight_document(pdf_file, keyword_map, color_map, cache=None, output_path=None, pdf_hash=None):
+    """
+    Returns the PDF with every keyword highlighted, from cache when the same
+    PDF was already highlighted for the same keyword set. Independent of
+    run_analysis, so the dashboard can show the analysis first and
+    highlight on demand or in the background.
+    In-memory inputs give bytes. Path inputs (and output_path) are written
+    straight to disk and give the file's path, kept in the cache's disk tier
+    unless output_path says where. pdf_hash works as in run_analysis.
+    """
+    source = processor.pdf_source(pdf_file)
+    file_backed = output_path is not None or processor.is_pdf_path(source)
+
+    key = None
+    if cache is not None:
+        if pdf_hash is None:
+            pdf_hash = hash_pdf(source)
+        key = cache_key(source, keyword_map, "highlighted", pdf_hash=pdf_hash)
+        highlighted_pdf = cache.get_file(key, ".pdf") if file_backed else cache.get(key)
+        if highlighted_pdf is None:
+            # Same paper highlighted for other keywords: only update what changed
+            highlighted_pdf = _update_highlighted(pdf_hash, keyword_map, color_map, cache, key, file_backed)
+        if highlighted_pdf is not None:
+            cache.put(_latest_key(pdf_hash, "highlighted"), keyword_map)
+            if output_path is not None:
+                shutil.copyfile(highlighted_pdf, output_path)
+                return output_path
+            return highlighted_pdf
+
+    # Highlighting reads word boxes, not the page text, so nothing is extracted up front
+    doc = processor.parse_pdf(source, lazy=True, pdf_hash=pdf_hash)
+    try:
+        for _ in processor.iter_highlight_pdf(doc, keyword_map, color_map):
+            pass
+        highlighted_pdf = _save_highlighted(doc, cache, key, output_path)
+    finally:
+        doc.close()
+    if cache is not None:
+        cache.put(_latest_key(pdf_hash, "highlighted"), keyword_map)
+    return highlighted_pdf
+
+def overlay_document(pdf_file, keyword_map, color_map, cache=None, pdf_hash=None):
+    """
+    Returns the highlights of a PDF as an annotation overlay (see
+    overlay.build_overlay), from cache when the same PDF was already
+    processed with the same keyword set. The overlay is kilobytes where the
+    highlighted PDF is a full copy of the paper; apply_overlay turns it
+    into the highlighted PDF when one is needed. pdf_hash works as in
+    run_analysis (the overlay always records it, so the PDF is hashed once
+    here without one).
+    """
+    source = processor.pdf_source(pdf_file)
+    if pdf_hash is None:
+        pdf_hash = hash_pdf(source)
+    key = None
+    if cache is not None:
+        key = cache_key(source, keyword_map, "overlay", pdf_hash=pdf_hash)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    doc = processor.parse_pdf(source, lazy=True, pdf_hash=pdf_hash)
+    try:
+        highlight_overlay = overlay.build_overlay(doc, keyword_map, color_map)
+    finally:
+        doc.close()
+    if cache is not None:
+        cache.put(key, highlight_overlay)
+    return highlight_overlay
+
+def apply_overlay(pdf_file, highlight_overlay, output_path=None, pdf_hash=None):
+    """
+    Highlights the original PDF from an overlay made by overlay_document,
+    without extracting or matching any text. pdf_hash (cache.hash_pdf of
+    the PDF) saves hashing it again for the document check.
+    Returns:
+        - bytes of the highlighted PDF, or output_path once it is written there
+    Raises:
+        - ValueError when the overlay was made from another PDF
+    """
+    source = processor.pdf_source(pdf_file)
+    document = highlight_overlay.get("document")
+    if document is not None:
+        if pdf_hash is None:
+            pdf_hash = hash_pdf(source)
+        if document != pdf_hash:
+            raise ValueError("The overlay was made from a different PDF")
+    doc = processor.parse_pdf(source, lazy=True, pdf_hash=pdf_hash)
+    try:
+        overlay.apply_overlay(doc.fitz_doc, highlight_overlay)
+        return processor.save_pdf(doc, output_path)
+    finally:
+        doc.close()
+
+def _update_highlighted(pdf_hash, keyword_map, color_map, cache, key, file_backed):
+    """
+    Derives the highlighted PDF for keyword_map from the one last made for
+    the same paper with other keywords: the pages where the keyword
+    change matters are highlighted again,
+    and the copy is saved incrementally (the changes are appended to the
+    file). Returns None when the previous PDF or the analysis for
+    keyword_map (whose search index locates the pages) is not cached.
+    """
+    previous_map = cache.get(_latest_key(pdf_hash, "highlighted"))
+    if previous_map is None or previous_map == keyword_map:
+        return None
+    previous_key = cache_key(None, previous_map, "highlighted", pdf_hash=pdf_hash)
+    previous_pdf = cache.get_file(previous_key, ".pdf") if file_backed else cache.get(previous_key)
+    result = cache.get(cache_key(None, keyword_map, pdf_hash=pdf_hash))
+    if previous_pdf is None or result is None:
+        return None
+
+    search_index = result["search_index"]
+    _, stems, literal = incremental.keyword_diff(previous_map, keyword_map)
+    pages = incremental.affected_pages(search_index, incremental.affected_sentences(search_index, stems, literal))
+
+    # The cached PDF belongs to the previous keywords, so a copy is updated
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=cache.cache_dir or processor.SPOOL_DIR)
+    os.close(fd)
+    try:
+        if file_backed:
+            shutil.copyfile(previous_pdf, tmp_path)
+        else:
+            with open(tmp_path, "wb") as f:
+                f.write(previous_pdf)
+        with processor.open_pdf(tmp_path) as fitz_doc:
+            processor.update_highlights(fitz_doc, keyword_map, color_map, pages)
+            saved_path = processor.save_pdf_incremental(fitz_doc, tmp_path)
+    except BaseException:
+        _remove_file(tmp_path)
+        _remove_file(tmp_path + ".full")
+        raise
+    if saved_path != tmp_path:
+        _remove_file(tmp_path)
+
+    if file_backed:
+        return cache.put_file(key, ".pdf", saved_path)
+    with open(saved_path, "rb") as f:
+        highlighted_pdf = f.read()
+    _remove_file(saved_path)
+    cache.put(key, highlighted_pdf)
+    return highlighted_pdf
+
+def _latest_key(pdf_hash, kind):
+    # Cache entry holding the keyword map a paper was last analyzed or highlighted with
+    return cache_key(None, {}, f"latest-{kind}", pdf_hash=pdf_hash)
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _save_highlighted(doc, cache, key, output_path=None):
+    """
+    Saves an annotated document: as bytes for documents opened from memory,
+    otherwise straight to output_path or a file in the cache's disk tier.
+    """
+    if output_path is not None:
+        return processor.save_pdf(doc, output_path)
+    if doc.path is None:
+        highlighted_pdf = processor.save_pdf(doc)
+        if cache is not None:
+            cache.put(key, highlighted_pdf)
+        return highlighted_pdf
+
+    # Written next to the cache entries (or as a standalone temp file) and moved into place once complete
+    directory = cache.cache_dir if cache is not None and cache.cache_dir else processor.SPOOL_DIR
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp" if cache is not None else ".pdf", dir=directory)
+    os.close(fd)
+    try:
+        processor.save_pdf(doc, tmp_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    if cache is None:
+        return tmp_path
+    return cache.put_file(key, ".pdf", tmp_path)
@@ -0,0 +1,70 @@
+import os
+import threading
+from collections import OrderedDict
+
+import perf
+from processor import open_pdf
+
+# Resolution of the page images in the dashboard preview; low enough that a
+# page is a few dozen KB, high enough to spot the highlights
+DEFAULT_PREVIEW_DPI = int(os.environ.get("SKIMMATE_PREVIEW_DPI", 72))
+DEFAULT_RENDER_CACHE_PAGES = 256
+
+class PageRenderCache:
+    """
+    LRU cache of rendered page images (PNG bytes), keyed by document id,
+    page number and DPI. Only the pages asked for are rasterized, so the
+    preview of a 300-page paper costs the same as that of a 3-page one.
+    Page counts are kept in a second LRU of the same size, so neither
+    grows with the number of documents previewed. Safe to share between threads.
+    """
+    def __init__(self, max_pages=DEFAULT_RENDER_CACHE_PAGES):
+        self.max_pages = max_pages
+        self._images = OrderedDict()
+        self._page_counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def page_count(self, doc_id, pdf):
+        """Returns the number of pages of the document (bytes or path)."""
+        with self._lock:
+            if doc_id in self._page_counts:
+                self._page_counts.move_to_end(doc_id)
+                return self._page_counts[doc_id]
+        with open_pdf(pdf) as doc:
+            count = doc.page_count
+        with self._lock:
+            self._page_counts[doc_id] = count
+            while len(self._page_counts) > self.max_pages:
+                self._page_counts.popitem(last=False)
+        return count
+
+    def render_pages(self, doc_id, pdf, page_nums, dpi=DEFAULT_PREVIEW_DPI):
+        """
+        Returns the PNG bytes of each page in page_nums (0-based) of a PDF
+        (bytes or path), rendering only the pages that are not cached yet.
+        doc_id must change whenever the PDF does (e.g. a content hash).
+        """
+        images = {}
+        missing = []
+        with self._lock:
+            for page_num in page_nums:
+                key = (doc_id, page_num, dpi)
+                if key in self._images:
+                    self._images.move_to_end(key)
+                    images[page_num] = self._images[key]
+                else:
+                    missing.append(page_num)
+
+        if missing:
+            rendered = {}
+            with perf.stage("page_render"), open_pdf(pdf) as doc:
+                for page_num in missing:
+                    rendered[page_num] = doc[page_num].get_pixmap(dpi=dpi).tobytes("png")
+            images.update(rendered)
+            with self._lock:
+                for page_num, image in rendered.items():
+                    self._images[(doc_id, page_num, dpi)] = image
+                while len(self._images) > self.max_pages:
+                    self._images.popitem(last=False)
+
+        return [images[page_num] for page_num in page_nums]
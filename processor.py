@@ -1,152 +1,401 @@
 import fitz  # PyMuPDF
 import io
-import re
+import os
+import shutil
+import tempfile
+from bisect import bisect_right
 from collections import defaultdict
+import perf
+from matcher import get_matcher, group_matches_by_sentence, normalize_keyword
+from citations import scan_citations
+from context import ContextTable
+from highlighter import merge_highlights, page_highlights
+from segmenter import Segmenter, clean_page_text
+from triage import DEFAULT_TOP_K, rank_sentences
 
-def extract_sentences_with_keywords(pdf_file, keyword_map):
+# Uploads larger than this are spooled to a temp file and opened by path
+# instead of being kept in memory (see spool_pdf)
+SPOOL_THRESHOLD = int(os.environ.get("SKIMMATE_SPOOL_THRESHOLD", 32 * 1024 * 1024))
+SPOOL_DIR = os.environ.get("SKIMMATE_SPOOL_DIR") or None
+SPOOL_CHUNK_SIZE = 1024 * 1024
+# Author of the annotations SkimMate adds, to tell them apart from the paper's own
+ANNOTATION_AUTHOR = "SkimMate"
+# Joins the keywords of merged matches in an annotation's content
+KEYWORD_SEPARATOR = ", "
+# Updates appended to a highlighted PDF before it is rewritten in full, since
+# each one keeps the annotations it replaced in the file
+MAX_INCREMENTAL_SAVES = 3
+
+class ParsedDocument:
+    """
+    A PDF parsed once and shared by every analysis stage.
+    Holds the open fitz.Document, the cleaned text of each page and the
+    sentence spans found by segmenter.Segmenter: (page, start, end) offsets
+    into the document text, where page is the page the sentence starts on.
+    sentence_spans[page_num] lists the sentences completed on that page, so
+    a sentence running over a page break is listed on the page it ends on.
+    With lazy=True, pages are only extracted when first requested through
+    load_page, so analysis can start before the whole document is read.
+    A document opened from a path keeps it in path (and pdf_bytes is None).
+    pdf_hash is the cache.hash_pdf digest of the PDF, when the caller has it.
+    """
+    def __init__(self, fitz_doc, pdf_bytes=None, lazy=False, path=None, pdf_hash=None):
+        self.fitz_doc = fitz_doc
+        self.pdf_bytes = pdf_bytes
+        self.path = path
+        self.pdf_hash = pdf_hash
+        self.pages = []
+        self.page_starts = []
+        self.sentence_spans = []
+        self._page_count = fitz_doc.page_count
+        self._segmenter = Segmenter()
+        self._text = None
+        if not lazy and self._page_count:
+            self.load_page(self._page_count - 1)
+
+    @property
+    def page_count(self):
+        return self._page_count
+
+    @property
+    def text(self):
+        """Full document text, joined once on first use."""
+        if self._text is None:
+            if self._page_count:
+                self.load_page(self._page_count - 1)
+            self._text = "".join(self.pages)
+        return self._text
+
+    def load_page(self, page_num):
+        """
+        Returns (text, sentence_spans) of a page, extracting it on first use.
+        Pages are segmented in order, so any earlier page is extracted first.
+        """
+        while len(self.pages) <= page_num:
+            next_page = len(self.pages)
+            with perf.stage("text_extraction"):
+                text = clean_page_text(self.fitz_doc[next_page].get_text("text"))
+            self.add_page_text(next_page, text)
+        return self.pages[page_num], self.sentence_spans[page_num]
+
+    def add_page_text(self, page_num, text):
+        """
+        Appends the cleaned text of the next page, which may have been
+        extracted elsewhere (e.g. by a parallel worker), and segments it.
+        """
+        if page_num != len(self.pages):
+            raise ValueError(f"Page {page_num} added out of order (expected page {len(self.pages)})")
+        self.page_starts.append(self._segmenter.length)
+        with perf.stage("sentence_splitting"):
+            spans = self._segmenter.add_page(page_num, text)
+            if page_num == self._page_count - 1:
+                spans += self._segmenter.finish()
+        self.pages.append(text)
+        self.sentence_spans.append(spans)
+        self._text = None
+
+    def sentence_text(self, span):
+        """Returns the text of a sentence span."""
+        page_num, start, end = span
+        offset = self.page_starts[page_num]
+        text = self.pages[page_num]
+        if end - offset <= len(text):
+            return text[start - offset:end - offset]
+        # The sentence continues on the following page(s)
+        last_page = bisect_right(self.page_starts, end - 1) - 1
+        return "".join(self.pages[page_num:last_page + 1])[start - offset:end - offset]
+
+    def to_document_offsets(self, page_num, matches):
+        """Shifts matches found in a page's text to document offsets."""
+        offset = self.page_starts[page_num]
+        return [(start + offset, end + offset, kw, category) for start, end, kw, category in matches]
+
+    def iter_sentences(self):
+        """
+        Yields (page_num, sentence) for every non-empty sentence in document order.
+        page_num is 0-based.
+        """
+        for page_num in range(self.page_count):
+            _, spans = self.load_page(page_num)
+            for span in spans:
+                yield span[0], self.sentence_text(span)
+
+    def close(self):
+        self.fitz_doc.close()
+
+def parse_pdf(pdf_file, lazy=False, pdf_hash=None):
+    """
+    Opens the PDF once and extracts everything the analysis stages need.
+    Accepts raw bytes, a file-like object (the file pointer is reset
+    afterwards) or a path, which PyMuPDF reads from disk as needed.
+    With lazy=True, page text is extracted on demand instead of up front.
+    pdf_hash (cache.hash_pdf of the PDF) is kept on the document, if given.
+    Returns:
+        - ParsedDocument
+    """
+    source = pdf_source(pdf_file)
+    with perf.stage("pdf_open"):
+        fitz_doc = open_pdf(source)
+    if is_pdf_path(source):
+        return ParsedDocument(fitz_doc, lazy=lazy, path=source, pdf_hash=pdf_hash)
+    return ParsedDocument(fitz_doc, source, lazy=lazy, pdf_hash=pdf_hash)
+
+def is_pdf_path(pdf_file):
+    return isinstance(pdf_file, (str, os.PathLike))
+
+def pdf_source(pdf_file):
+    """Returns a path as a string, and the content of raw bytes or a file-like object."""
+    if is_pdf_path(pdf_file):
+        return os.fspath(pdf_file)
+    return read_pdf_bytes(pdf_file)
+
+def open_pdf(source):
+    """Opens a path (file-backed) or the bytes of a PDF with PyMuPDF."""
+    if is_pdf_path(source):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
+
+def spool_pdf(pdf_file, directory=SPOOL_DIR):
     """
-    Extracts sentences containing keywords from the PDF.
+    Copies a file-like object (e.g. a large upload) to a temp file in chunks,
+    so it can be opened by path instead of read into memory.
+    Returns:
+        - path of the temp file; the caller removes it
+    """
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pdf_file.seek(0)
+            shutil.copyfileobj(pdf_file, f, SPOOL_CHUNK_SIZE)
+        pdf_file.seek(0)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+def read_pdf_bytes(pdf_file):
+    """Returns the content of raw bytes or a file-like object, resetting its file pointer."""
+    if isinstance(pdf_file, (bytes, bytearray)):
+        return bytes(pdf_file)
+    pdf_bytes = pdf_file.read()
+    pdf_file.seek(0)
+    return pdf_bytes
+
+def extract_sentences_with_keywords(doc, keyword_map):
+    """
+    Extracts sentences containing keywords from a ParsedDocument.
     Returns:
         - stats: dict {category: count}
-        - context: list of dicts {page, sentence, keyword, category}
+        - keyword_counts: dict {keyword: count}
+        - context: ContextTable with one {page, sentence, keyword, category} row per match
     """
-    doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
     stats = defaultdict(int)
     keyword_counts = defaultdict(int)
-    context_data = []
+    context_data = ContextTable()
     
-    # Reset file pointer for later use
-    pdf_file.seek(0)
-    
-    for page_num, page in enumerate(doc):
-        text = page.get_text("text")
-        # Simple sentence splitting (can be improved)
-        sentences = re.split(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?)\s', text)
-        
-        for sentence in sentences:
-            clean_sentence = sentence.strip()
-            if not clean_sentence:
-                continue
-                
-            lower_sentence = clean_sentence.lower()
-            
-            # Check for keywords
-            found_keywords = []
-            for kw, category in keyword_map.items():
-                if kw in lower_sentence:
-                    # Basic word boundary check could be added here
-                    stats[category] += 1
-                    keyword_counts[kw] += 1
-                    found_keywords.append((kw, category))
-            
-            if found_keywords:
-                # Store context (taking the first found keyword's category for simplicity in display, 
-                # or we could list all)
-                for kw, category in found_keywords:
-                    context_data.append({
-                        "page": page_num + 1,
-                        "sentence": clean_sentence,
-                        "keyword": kw,
-                        "category": category
-                    })
+    for _, page_stats, page_counts, page_context in iter_sentences_with_keywords(doc, keyword_map):
+        merge_page_result(stats, keyword_counts, context_data, page_stats, page_counts, page_context)
                     
     return stats, keyword_counts, context_data
 
-def highlight_pdf(pdf_file, keyword_map, color_map):
+def iter_sentences_with_keywords(doc, keyword_map):
     """
-    Highlights keywords in the PDF.
+    Streaming variant of extract_sentences_with_keywords.
+    Pages are extracted and matched one at a time, so the first results are
+    available after a single page.
+    Yields:
+        - (page_num, stats, keyword_counts, context) for each page, in page order
+    """
+    matcher = get_matcher(keyword_map)
+    carry = []
+    for page_num in range(doc.page_count):
+        text, _ = doc.load_page(page_num)
+        with perf.stage("keyword_matching"):
+            page_stats, page_counts, page_context, carry = analyze_page(doc, page_num, matcher.find_all(text), carry)
+        yield page_num, page_stats, page_counts, page_context
+
+def analyze_page(doc, page_num, page_matches, carry=()):
+    """
+    Assigns the keyword matches of a page (page offsets, as returned by
+    KeywordMatcher.find_all on the page text) to the sentences completed on it.
+    carry holds matches from earlier pages that belong to a sentence that
+    was still open; pass back the returned carry for the next page.
     Returns:
-        - bytes: Highlighted PDF content
+        - stats: dict {category: count}
+        - keyword_counts: dict {keyword: count}
+        - context: ContextTable of the page's matches
+        - carry: matches to pass on to the next page
     """
-    doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
-    pdf_file.seek(0) # Reset
+    stats = {}
+    keyword_counts = {}
+    context_data = ContextTable()
     
-    for page in doc:
-        for kw, category in keyword_map.items():
-            # Search for the keyword
-            quads = page.search_for(kw)
-            
-            # Get color for the category
-            color = color_map.get(category, (1, 1, 0)) # Default yellow
+    matches = list(carry) + doc.to_document_offsets(page_num, page_matches)
+    groups, carry = group_matches_by_sentence(matches, doc.sentence_spans[page_num])
+    for span, sentence_matches in groups:
+        relative = [(start - span[1], end - span[1], kw, category) for start, end, kw, category in sentence_matches]
+        found_keywords = add_sentence_matches(context_data, span[0] + 1, doc.sentence_text(span), relative, span[1])
+        for kw, category in found_keywords.items():
+            stats[category] = stats.get(category, 0) + 1
+            keyword_counts[kw] = keyword_counts.get(kw, 0) + 1
+    
+    return stats, keyword_counts, context_data, carry
+
+def add_sentence_matches(context_data, page, sentence, matches, start=0):
+    """
+    Adds the rows of one sentence to a ContextTable: one per keyword, in
+    order of first occurrence, however often the keyword occurs. matches
+    are (start, end, keyword, category) relative to the sentence; their
+    offsets feed the preview snippet. start is the sentence's document offset.
+    Returns:
+        - dict {keyword: category} of the rows added
+    """
+    found_keywords = {}
+    for match_start, match_end, kw, category in matches:
+        found_keywords.setdefault(kw, (category, []))[1].append((match_start, match_end))
+    
+    # The sentence is stored once, however many keywords it contains
+    sentence_id = context_data.add_sentence(sentence, start)
+    for kw, (category, offsets) in found_keywords.items():
+        form = normalize_keyword(sentence[offsets[0][0]:offsets[0][1]])
+        context_data.add(page, sentence_id, kw, category, offsets, form)
+    return {kw: category for kw, (category, _) in found_keywords.items()}
+
+def merge_page_result(stats, keyword_counts, context_data, page_stats, page_counts, page_context):
+    """Adds the result of analyze_page to the document-wide accumulators."""
+    for category, count in page_stats.items():
+        stats[category] += count
+    for kw, count in page_counts.items():
+        keyword_counts[kw] += count
+    context_data.extend(page_context)
+
+def highlight_pdf(doc, keyword_map, color_map, highlights=None, output_path=None):
+    """
+    Highlights keywords in a ParsedDocument.
+    Annotations are added to the shared fitz.Document in place, so this
+    should run after every stage that reads the page text.
+    highlights can carry precomputed page_highlights results (one list per
+    page, e.g. from parallel workers); otherwise they are computed here.
+    Returns:
+        - bytes: Highlighted PDF content, or output_path once the PDF is written there
+    """
+    for _ in iter_highlight_pdf(doc, keyword_map, color_map, highlights):
+        pass
+    return save_pdf(doc, output_path)
+
+def iter_highlight_pdf(doc, keyword_map, color_map, highlights=None):
+    """
+    Streaming variant of highlight_pdf: annotates one page at a time.
+    Pages with a None entry in highlights are matched here. Touching
+    matches of a category are merged into one annotation (see
+    highlighter.merge_highlights).
+    Call save_pdf once the generator is exhausted.
+    Yields:
+        - (page_num, match_count, annotation_count) for each page, in page
+          order; the counts report how much merging saved
+    """
+    matcher = get_matcher(keyword_map)
+    
+    for page_num, page in enumerate(doc.fitz_doc):
+        with perf.stage("highlighting"):
+            # One word extraction and one matcher pass per page
+            if highlights is not None and highlights[page_num] is not None:
+                page_matches = highlights[page_num]
+            else:
+                page_matches = page_highlights(page, matcher)
             
-            # Add highlight
-            for quad in quads:
-                annot = page.add_highlight_annot(quad)
-                annot.set_colors(stroke=color)
-                annot.update()
-                
+            merged = merge_highlights(page_matches)
+            for keywords, category, rects in merged:
+                add_highlight(page, keywords, category, rects, color_map)
+        
+        yield page_num, len(page_matches), len(merged)
+
+def add_highlight(page, keywords, category, rects, color_map):
+    """
+    Adds one highlight annotation (one quad per rect) for merged matches,
+    labelled with their keywords and category so it can be found again.
+    """
+    color = color_map.get(category, (1, 1, 0)) # Default yellow
+    annot = page.add_highlight_annot([fitz.Rect(rect) for rect in rects])
+    annot.set_colors(stroke=color)
+    annot.set_info(title=ANNOTATION_AUTHOR, subject=category, content=KEYWORD_SEPARATOR.join(keywords))
+    annot.update()
+
+def update_highlights(fitz_doc, keyword_map, color_map, pages):
+    """
+    Redoes the highlights of some pages of an already highlighted document
+    for keyword_map: the SkimMate annotations on those pages are deleted
+    and the page is highlighted again. Whole pages are redone because an
+    annotation can hold merged matches of several keywords. Other
+    annotations and pages are left untouched.
+    Returns:
+        - (annotations removed, annotations added)
+    """
+    matcher = get_matcher(keyword_map)
+    removed = added = 0
+    for page_num in pages:
+        with perf.stage("highlighting"):
+            page = fitz_doc[page_num]
+            stale = [
+                annot.xref for annot in page.annots(types=[fitz.PDF_ANNOT_HIGHLIGHT])
+                if annot.info.get("title") == ANNOTATION_AUTHOR
+            ]
+            for xref in stale:
+                page.delete_annot(page.load_annot(xref))
+            removed += len(stale)
+            for keywords, category, rects in merge_highlights(page_highlights(page, matcher)):
+                add_highlight(page, keywords, category, rects, color_map)
+                added += 1
+    return removed, added
+
+def save_pdf_incremental(fitz_doc, path):
+    """
+    Saves the changes to a document opened from path by appending them to
+    the file, instead of rewriting it. When the file does not allow
+    incremental updates (e.g. it had to be repaired) or already carries
+    MAX_INCREMENTAL_SAVES of them, the document is saved in full next to
+    it instead, dropping the annotations earlier updates replaced.
+    Returns:
+        - the path the document was saved to
+    """
+    with perf.stage("pdf_save"):
+        if fitz_doc.can_save_incrementally() and fitz_doc.version_count <= MAX_INCREMENTAL_SAVES:
+            fitz_doc.saveIncr()
+            return path
+        full_path = path + ".full"
+        fitz_doc.save(full_path, garbage=1)
+    return full_path
+
+def save_pdf(doc, output_path=None):
+    """
+    Returns the bytes of the (annotated) document, or writes it to
+    output_path and returns the path.
+    """
+    if output_path is not None:
+        with perf.stage("pdf_save"):
+            doc.fitz_doc.save(output_path)
+        return output_path
     output_buffer = io.BytesIO()
-    doc.save(output_buffer)
+    with perf.stage("pdf_save"):
+        doc.fitz_doc.save(output_buffer)
     return output_buffer.getvalue()
 
-def generate_paper_triage(text_content):
+def generate_paper_triage(doc, top_k=DEFAULT_TOP_K):
     """
     Generates a heuristic-based triage of the paper using keyword matching.
+    All triage categories are scored in one pass (see triage.rank_sentences).
+    Returns:
+        - dict {category: [{sentence, score, page}, ...]}, best candidate first;
+          an empty list means nothing was detected
     """
-    triage = {
-        "research_gap": "Not detected.",
-        "dataset_used": "Not detected.",
-        "main_conclusion": "Not detected."
-    }
-    
-    # Heuristics
-    gap_keywords = ["limitation", "gap", "however", "although", "future work", "remains to be", "insufficient", "lack of"]
-    data_keywords = ["dataset", "survey", "participants", "sample size", "n =", "collected from", "database", "corpus"]
-    conclusion_keywords = ["conclude", "conclusion", "results show", "findings indicate", "summary", "demonstrate", "suggests"]
-    
-    # Split into sentences (simple split)
-    sentences = re.split(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?)\s', text_content)
-    
-    # Helper to find best sentence
-    def find_best_sentence(keywords):
-        best_sent = None
-        max_score = 0
-        
-        for sent in sentences:
-            clean_sent = sent.strip()
-            if len(clean_sent) < 20 or len(clean_sent) > 500: # Filter too short/long
-                continue
-                
-            score = 0
-            lower_sent = clean_sent.lower()
-            for kw in keywords:
-                if kw in lower_sent:
-                    score += 1
-            
-            if score > max_score:
-                max_score = score
-                best_sent = clean_sent
-                
-        return best_sent
-
-    # Find best matches
-    gap = find_best_sentence(gap_keywords)
-    if gap: triage["research_gap"] = gap
-    
-    data = find_best_sentence(data_keywords)
-    if data: triage["dataset_used"] = data
-    
-    conclusion = find_best_sentence(conclusion_keywords)
-    if conclusion: triage["main_conclusion"] = conclusion
-    
-    return triage
+    return rank_sentences(doc, top_k)
 
-def extract_citations(text):
+def extract_citations(doc):
     """
-    Extracts citations from the text using regex.
-    Supports formats like [1], [12], (Author, 2023).
+    Finds the in-text citations of a ParsedDocument ([1], [2-4],
+    Smith et al. (2020), (Smith and Lee, 2020; Wu, 2019)) and links them to
+    the entries of its References section. See citations.scan_citations.
+    Returns:
+        - dict with citations, references (with how often each is cited) and unresolved keys
     """
-    citations = set()
-    
-    # Pattern for [1], [12], [1-3]
-    bracket_pattern = r'\[\d+(?:-\d+)?(?:,\s*\d+)*\]'
-    matches = re.findall(bracket_pattern, text)
-    citations.update(matches)
-    
-    # Pattern for (Author, Year) - simplified
-    # Looks for (Word, 19xx or 20xx)
-    author_year_pattern = r'\([A-Z][a-z]+(?: et al\.)?, \d{4}\)'
-    matches = re.findall(author_year_pattern, text)
-    citations.update(matches)
-    
-    return sorted(list(citations))
+    return scan_citations(doc)
@@ -0,0 +1,126 @@
+import math
+from array import array
+from bisect import bisect_left
+
+from context import make_snippet
+from matcher import TOKEN
+from stemmer import stem_token
+
+# Shortest last query word that is also matched as a prefix ("calib" -> "calibration")
+MIN_PREFIX_LENGTH = 3
+# Most index terms one prefix expands to
+MAX_PREFIX_TERMS = 50
+DEFAULT_SEARCH_LIMIT = 20
+
+class SearchIndex:
+    """
+    Inverted index over every sentence of a paper, built once during the
+    analysis so that ad-hoc terms are looked up instead of rescanning the
+    document. Terms are word stems (stemmer.py), so "models" finds "model".
+    The document text is stored once; sentences are (start, end) offsets
+    into it, and each term's postings are a flat array of
+    (sentence id, start, end) triplets, with token offsets relative to the
+    sentence. page_starts holds the offset of each page in the text.
+    Since it keeps the text and sentence spans of the paper, the index also
+    lets incremental.py rematch sentences without reopening the PDF.
+    """
+    def __init__(self, text, page_starts=()):
+        self.text = text
+        self.page_starts = array("I", page_starts)
+        self.pages = array("I")
+        self.starts = array("I")
+        self.ends = array("I")
+        self.postings = {}
+        self._terms = None
+
+    @classmethod
+    def from_document(cls, doc):
+        """Indexes every sentence of a ParsedDocument (all pages are extracted)."""
+        index = cls(doc.text, doc.page_starts)
+        for spans in (doc.load_page(page_num)[1] for page_num in range(doc.page_count)):
+            for page_num, start, end in spans:
+                index.add_sentence(page_num + 1, start, end)
+        return index
+
+    def add_sentence(self, page, start, end):
+        """Indexes the sentence at text[start:end]; page is 1-based."""
+        sentence_id = len(self.starts)
+        self.pages.append(page)
+        self.starts.append(start)
+        self.ends.append(end)
+        postings = self.postings
+        for token in TOKEN.finditer(self.text, start, end):
+            term = stem_token(token.group())
+            entries = postings.get(term)
+            if entries is None:
+                entries = postings[term] = array("I")
+            entries.extend((sentence_id, token.start() - start, token.end() - start))
+        self._terms = None
+
+    def __len__(self):
+        return len(self.starts)
+
+    def sentence(self, sentence_id):
+        return self.text[self.starts[sentence_id]:self.ends[sentence_id]]
+
+    def search(self, query, limit=DEFAULT_SEARCH_LIMIT):
+        """
+        Finds the sentences containing the words of query. Sentences with
+        more of the query words rank first, then by tf-idf score, then in
+        document order. The last word also matches as a prefix, so results
+        appear while a word is still being typed.
+        Returns:
+            - (hits, total): hits are the best `limit` sentences as
+              [{"page", "sentence", "snippet", "score"}] with the matched
+              words highlighted in snippet; total counts every matching sentence
+        """
+        words = [token.group().lower() for token in TOKEN.finditer(query)]
+        if not words:
+            return [], 0
+
+        n_sentences = len(self)
+        matched = {}
+        scores = {}
+        offsets = {}
+        for position, word in enumerate(words):
+            terms = {stem_token(word)}
+            if position == len(words) - 1 and len(word) >= MIN_PREFIX_LENGTH:
+                terms.update(self._terms_with_prefix(word))
+            # Occurrences per sentence of this query word (any of its terms)
+            counts = {}
+            for term in terms:
+                entries = self.postings.get(term)
+                if entries is None:
+                    continue
+                for i in range(0, len(entries), 3):
+                    sentence_id = entries[i]
+                    counts[sentence_id] = counts.get(sentence_id, 0) + 1
+                    offsets.setdefault(sentence_id, []).append((entries[i + 1], entries[i + 2]))
+            if not counts:
+                continue
+            idf = math.log(1 + n_sentences / len(counts))
+            for sentence_id, count in counts.items():
+                matched[sentence_id] = matched.get(sentence_id, 0) + 1
+                scores[sentence_id] = scores.get(sentence_id, 0.0) + idf * count / (count + 1)
+
+        ranked = sorted(matched, key=lambda sentence_id: (-matched[sentence_id], -scores[sentence_id], sentence_id))
+        hits = []
+        for sentence_id in ranked[:limit]:
+            sentence = self.sentence(sentence_id)
+            hits.append({
+                "page": self.pages[sentence_id],
+                "sentence": sentence,
+                "snippet": make_snippet(sentence, sorted(offsets[sentence_id])),
+                "score": round(scores[sentence_id], 4),
+            })
+        return hits, len(ranked)
+
+    def _terms_with_prefix(self, prefix):
+        if self._terms is None:
+            self._terms = sorted(self.postings)
+        terms = []
+        i = bisect_left(self._terms, prefix)
+        while i < len(self._terms) and self._terms[i].startswith(prefix) and len(terms) < MAX_PREFIX_TERMS:
+            terms.append(self._terms[i])
+            i += 1
+        return terms
@@ -0,0 +1,81 @@
+import re
+
+# A sentence ends at ".", "?" or "!" followed by whitespace, except after
+# abbreviations like "e.g." or "Dr."
+SENTENCE_BOUNDARY = re.compile(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=[.?!])\s')
+# Closing punctuation that may follow the end of a sentence
+SENTENCE_END = re.compile(r'[.?!]["\')\]]*$')
+# A word split over two lines: "implemen-\ntation"
+HYPHENATION = re.compile(r'(?<=[a-z])-\n(?=[a-z])')
+
+def clean_page_text(text):
+    """
+    Repairs words hyphenated across line breaks and makes sure the page ends
+    with a newline, so consecutive pages join into well-separated text.
+    """
+    text = HYPHENATION.sub("", text)
+    if not text.endswith("\n"):
+        text += "\n"
+    return text
+
+class Segmenter:
+    """
+    Incremental sentence segmentation over the pages of a document.
+    Pages are added in order. Spans are (page, start, end) tuples: page is
+    the page the sentence starts on, and start/end are offsets into the
+    document text (all page texts joined), trimmed of surrounding whitespace.
+    A sentence left unfinished at the bottom of a page continues on the
+    next one instead of being cut in two.
+    """
+    def __init__(self):
+        self.length = 0
+        # (page, start) and end of the sentence still open at the end of the last page
+        self._open = None
+        self._open_end = None
+
+    def add_page(self, page_num, text):
+        """Segments the next page and returns the spans of the sentences it completes."""
+        base = self.length
+        self.length += len(text)
+        spans = []
+        pos = 0
+        for boundary in SENTENCE_BOUNDARY.finditer(text):
+            self._close(spans, page_num, text, base, pos, boundary.start())
+            pos = boundary.end()
+
+        start, end = _trim(text, pos, len(text))
+        if start < end:
+            if self._open is None:
+                self._open = (page_num, base + start)
+            if SENTENCE_END.search(text, start, end):
+                spans.append(self._open + (base + end,))
+                self._open = None
+            else:
+                self._open_end = base + end
+        return spans
+
+    def finish(self):
+        """Closes the sentence still open at the end of the document, if any."""
+        if self._open is None:
+            return []
+        page_num, start = self._open
+        self._open = None
+        return [(page_num, start, self._open_end)]
+
+    def _close(self, spans, page_num, text, base, pos, end):
+        start, end = _trim(text, pos, end)
+        if start >= end:
+            return
+        if self._open is not None:
+            # First fragment of this page finishes the sentence from the previous page
+            spans.append(self._open + (base + end,))
+            self._open = None
+        else:
+            spans.append((page_num, base + start, base + end))
+
+def _trim(text, start, end):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
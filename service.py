@@ -0,0 +1,333 @@
+"""
+Headless HTTP service for programmatic clients (reference managers,
+ingestion scripts). Standard library only; analyses run on a jobs.JobManager.
+
+    python -m skimmate serve --port 8765
+
+    POST /analyze            PDF as the request body; returns the analysis as JSON.
+                             Query: keywords=a,b  categories=Methodology,...
+                                    context=1 (include every matched sentence)
+                                    wait=0 (return 202 and a job id right away)
+    GET  /jobs/<id>          status and page progress of a job
+    GET  /jobs/<id>/result   the analysis of a finished job
+    POST /highlight          PDF as the request body; returns the highlighted PDF
+    POST /overlay            PDF as the request body; returns only the highlights
+                             (rects, keywords, colors) to apply to the original later
+                             Query: format=json (default) or xfdf
+    GET  /health             queue and worker status
+
+Connections are kept alive (HTTP/1.1) and large responses are streamed
+with chunked transfer encoding. When the queue is full, requests get
+503 with a Retry-After header; bodies that are not a readable PDF get 422,
+and analyses that fail for any other reason 500.
+"""
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import fitz
+
+import jobs
+import overlay
+import pipeline
+import processor
+from cache import ResultCache
+from utils import CATEGORY_COLORS, DEFAULT_KEYWORDS, get_flattened_keywords
+
+# Largest PDF accepted in a request body
+MAX_UPLOAD_BYTES = int(os.environ.get("SKIMMATE_MAX_UPLOAD_BYTES", 200 * 1024 * 1024))
+# Connections served at once; further clients wait in the listen backlog
+MAX_CONNECTIONS = int(os.environ.get("SKIMMATE_MAX_CONNECTIONS", 64))
+# Seconds an idle keep-alive connection stays open
+KEEP_ALIVE_TIMEOUT = 30
+# Seconds a client is told to wait when the service is saturated
+RETRY_AFTER = 5
+# Bytes per chunk of a streamed response or of a spooled upload
+STREAM_CHUNK_SIZE = 64 * 1024
+
+class RequestError(Exception):
+    """Ends a request with an HTTP error status and a JSON {"error": message} body."""
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+class AnalysisService(ThreadingHTTPServer):
+    """
+    ThreadingHTTPServer with a bounded number of connection threads, sharing
+    one JobManager (fixed worker pool, bounded queue) and one ResultCache.
+    Highlighting and overlays are limited to as many PDFs at once as there
+    are job workers.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, manager=None, max_connections=MAX_CONNECTIONS):
+        super().__init__(address, AnalysisRequestHandler)
+        self.manager = manager or jobs.JobManager(cache=ResultCache())
+        self.connection_slots = threading.BoundedSemaphore(max_connections)
+        self.highlight_slots = threading.BoundedSemaphore(self.manager.max_workers)
+
+    def process_request(self, request, client_address):
+        # Blocks the accept loop while every slot is taken, so excess clients
+        # queue in the kernel backlog instead of each getting a thread
+        self.connection_slots.acquire()
+        try:
+            super().process_request(request, client_address)
+        except BaseException:
+            self.connection_slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.connection_slots.release()
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = KEEP_ALIVE_TIMEOUT
+    server_version = "SkimMate"
+
+    def do_GET(self):
+        self._handle(self._get)
+
+    def do_POST(self):
+        self._handle(self._post)
+
+    def _handle(self, route):
+        url = urlsplit(self.path)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        # Set until _read_pdf has consumed the request body
+        self.body_pending = self.command == "POST"
+        try:
+            route(url.path.rstrip("/"), query)
+        except RequestError as e:
+            if self.body_pending:
+                # The unread body would be parsed as the next request
+                self.close_connection = True
+            self._send_json({"error": str(e)}, e.status, e.headers)
+        except fitz.FileDataError:
+            # Raised when PyMuPDF opens the body, before anything is sent; its
+            # message may name the spooled temp file, so it is not passed on
+            self._send_json({"error": jobs.NOT_A_PDF}, 422)
+        except Exception as e:
+            self.log_error("%s", f"{type(e).__name__}: {e}")
+            # The response may have been cut off mid-stream
+            self.close_connection = True
+            self._send_json({"error": f"{type(e).__name__}: {e}"}, 500)
+
+    def _get(self, path, query):
+        manager = self.server.manager
+        if path == "/health":
+            self._send_json(manager.stats())
+            return
+        parts = path.split("/")
+        if len(parts) not in (3, 4) or parts[1] != "jobs" or (len(parts) == 4 and parts[3] != "result"):
+            raise RequestError(404, f"Not found: {path}")
+        job = manager.get(parts[2])
+        if job is None:
+            raise RequestError(404, f"Unknown or expired job: {parts[2]}")
+        if len(parts) == 3:
+            self._send_json(job.snapshot())
+            return
+        if not job.done():
+            raise RequestError(409, "Job is not finished yet", {"Retry-After": str(RETRY_AFTER)})
+        self._send_result(job, query)
+
+    def _post(self, path, query):
+        if path not in ("/analyze", "/highlight", "/overlay"):
+            raise RequestError(404, f"Not found: {path}")
+        keyword_map = parse_keyword_map(query)
+        overlay_format = query.get("format", "json")
+        if path == "/overlay" and overlay_format not in overlay.OVERLAY_FORMATS:
+            raise RequestError(400, f"Unknown overlay format: {overlay_format} (expected one of {', '.join(overlay.OVERLAY_FORMATS)})")
+        pdf_source, spooled_path = self._read_pdf()
+        if path in ("/highlight", "/overlay"):
+            try:
+                if path == "/highlight":
+                    self._highlight(pdf_source, keyword_map)
+                else:
+                    self._overlay(pdf_source, keyword_map, overlay_format)
+            finally:
+                if spooled_path is not None:
+                    _remove(spooled_path)
+            return
+
+        try:
+            job = self.server.manager.submit(pdf_source, keyword_map, CATEGORY_COLORS)
+        except jobs.JobQueueFull as e:
+            if spooled_path is not None:
+                _remove(spooled_path)
+            raise RequestError(503, str(e), {"Retry-After": str(RETRY_AFTER)})
+        if spooled_path is not None:
+            _remove_when_done(job, spooled_path)
+
+        if query.get("wait") == "0":
+            # Polled through /jobs/<id>; finished jobs expire after jobs.JOB_RETENTION
+            self._send_json({"id": job.id, "status": job.snapshot()["status"]}, 202, {"Location": f"/jobs/{job.id}"})
+            return
+        job.wait()
+        try:
+            self._send_result(job, query)
+        finally:
+            self.server.manager.release(job)
+
+    def _send_result(self, job, query):
+        if job.status != jobs.DONE:
+            # The client's fault only when the upload is not a PDF; anything else failed here
+            status = 422 if job.error == jobs.NOT_A_PDF else 500
+            self._send_json({"id": job.id, "status": job.status, "error": job.error}, status)
+            return
+        record = {"id": job.id}
+        record.update(pipeline.result_record(job.result, include_context=query.get("context") == "1"))
+        self._send_json(record)
+
+    @contextmanager
+    def _highlight_slot(self):
+        # Highlighting and overlays run on the connection thread, so they are
+        # bounded separately from the job queue
+        slots = self.server.highlight_slots
+        if not slots.acquire(timeout=RETRY_AFTER):
+            raise RequestError(503, "Every worker is busy highlighting", {"Retry-After": str(RETRY_AFTER)})
+        try:
+            yield
+        finally:
+            slots.release()
+
+    def _highlight(self, pdf_source, keyword_map):
+        with self._highlight_slot():
+            highlighted_pdf = pipeline.highlight_document(pdf_source, keyword_map, CATEGORY_COLORS, cache=self.server.manager.cache)
+
+        if isinstance(highlighted_pdf, bytes):
+            self._send_bytes(highlighted_pdf, "application/pdf")
+            return
+        # File-backed output lives in the cache's disk tier and is streamed from there
+        with open(highlighted_pdf, "rb") as f:
+            self._send_chunked(iter(lambda: f.read(STREAM_CHUNK_SIZE), b""), "application/pdf")
+
+    def _overlay(self, pdf_source, keyword_map, overlay_format):
+        with self._highlight_slot():
+            highlight_overlay = pipeline.overlay_document(pdf_source, keyword_map, CATEGORY_COLORS, cache=self.server.manager.cache)
+        if overlay_format == "xfdf":
+            self._send_bytes(overlay.to_xfdf(highlight_overlay).encode("utf-8"), "application/vnd.adobe.xfdf")
+        else:
+            self._send_bytes(overlay.to_json(highlight_overlay).encode("utf-8"), "application/json")
+
+    def _read_pdf(self):
+        """
+        Reads the PDF request body: into memory when small, otherwise spooled
+        to a temp file (see processor.SPOOL_THRESHOLD) in chunks.
+        Returns:
+            - (bytes or path, spooled path or None)
+        """
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            raise RequestError(411, "Send the PDF with a Content-Length")
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            raise RequestError(411, "Send the PDF with a Content-Length")
+        if length <= 0:
+            raise RequestError(400, "Empty request body; send the PDF as the body")
+        if length > MAX_UPLOAD_BYTES:
+            raise RequestError(413, f"PDF larger than {MAX_UPLOAD_BYTES} bytes")
+
+        if length <= processor.SPOOL_THRESHOLD:
+            body = self.rfile.read(length)
+            self.body_pending = False
+            return body, None
+        fd, path = tempfile.mkstemp(suffix=".pdf", dir=processor.SPOOL_DIR)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                remaining = length
+                while remaining:
+                    chunk = self.rfile.read(min(STREAM_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise RequestError(400, "Request body ended early")
+                    f.write(chunk)
+                    remaining -= len(chunk)
+        except BaseException:
+            _remove(path)
+            raise
+        self.body_pending = False
+        return path, path
+
+    def _send_headers(self, status, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if self.close_connection:
+            # Tells keep-alive clients not to reuse the socket (e.g. after an unread body)
+            self.send_header("Connection", "close")
+        self.end_headers()
+
+    def _send_json(self, payload, status=200, headers=None):
+        # Small payloads get a Content-Length; large ones (e.g. with context) are streamed
+        encoder = json.JSONEncoder(ensure_ascii=False)
+        if status != 200 or "context" not in payload:
+            self._send_bytes(encoder.encode(payload).encode("utf-8"), "application/json", status, headers)
+            return
+        self._send_chunked(_buffered(encoder.iterencode(payload)), "application/json", status, headers)
+
+    def _send_bytes(self, body, content_type, status=200, headers=None):
+        self._send_headers(status, {"Content-Type": content_type, "Content-Length": str(len(body)), **(headers or {})})
+        self.wfile.write(body)
+
+    def _send_chunked(self, chunks, content_type, status=200, headers=None):
+        self._send_headers(status, {"Content-Type": content_type, "Transfer-Encoding": "chunked", **(headers or {})})
+        for chunk in chunks:
+            if chunk:
+                self.wfile.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+def parse_keyword_map(query):
+    """Builds the keyword map from the keywords= and categories= query parameters (comma separated)."""
+    categories = [c.strip() for c in query.get("categories", "").split(",") if c.strip()] or list(DEFAULT_KEYWORDS)
+    unknown = [c for c in categories if c not in DEFAULT_KEYWORDS]
+    if unknown:
+        raise RequestError(400, f"Unknown categories: {', '.join(unknown)}")
+    custom_keywords = [k.strip() for k in query.get("keywords", "").split(",") if k.strip()]
+    return get_flattened_keywords(categories, custom_keywords)
+
+def serve(host="127.0.0.1", port=8765, workers=None, max_queued=None, max_connections=None):
+    """Runs the service until interrupted."""
+    manager = jobs.JobManager(
+        cache=ResultCache(),
+        max_workers=workers or jobs.DEFAULT_JOB_WORKERS,
+        max_queued=jobs.DEFAULT_JOB_QUEUE if max_queued is None else max_queued,
+    )
+    with AnalysisService((host, port), manager, max_connections or MAX_CONNECTIONS) as server:
+        print(f"SkimMate service on http://{host}:{server.server_address[1]} "
+              f"({manager.max_workers} workers, queue of {manager.max_queued})", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+def _buffered(pieces):
+    # Joins the small strings of JSONEncoder.iterencode into STREAM_CHUNK_SIZE chunks
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= STREAM_CHUNK_SIZE:
+            yield "".join(buffer).encode("utf-8")
+            buffer, size = [], 0
+    yield "".join(buffer).encode("utf-8")
+
+def _remove_when_done(job, path):
+    # Deletes a spooled upload once the job that reads it has finished
+    if job.future is None:
+        _remove(path)
+    else:
+        job.future.add_done_callback(lambda future: _remove(path))
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,185 @@
+"""
+Command-line entry point for running SkimMate without the Streamlit UI.
+
+    python -m skimmate batch papers/ --output results.jsonl --highlight-dir highlighted/
+    python -m skimmate batch papers/ --overlay-dir overlays/ --overlay-format xfdf
+    python -m skimmate apply-overlay paper.pdf paper.overlay.json -o paper.highlighted.pdf
+    python -m skimmate bench --baseline benchmark_baseline.json
+    python -m skimmate corpus results.jsonl --rank Errors/Mistakes --normalize share
+    python -m skimmate serve --port 8765
+"""
+import argparse
+import os
+import sys
+
+from utils import DEFAULT_KEYWORDS, get_flattened_keywords
+
+def build_keyword_map(args):
+    categories = args.categories or list(DEFAULT_KEYWORDS.keys())
+    unknown = [c for c in categories if c not in DEFAULT_KEYWORDS]
+    if unknown:
+        raise SystemExit(f"Unknown categories: {', '.join(unknown)}")
+    custom_keywords = [k.strip() for k in (args.keywords or "").split(",") if k.strip()]
+    return get_flattened_keywords(categories, custom_keywords)
+
+def add_keyword_arguments(parser):
+    parser.add_argument("--keywords", help="custom keywords, comma separated")
+    parser.add_argument("--categories", nargs="+", metavar="CATEGORY",
+                        help="default keyword categories to use (default: all)")
+
+def cmd_batch(args):
+    import batch
+    if not os.path.isdir(args.directory):
+        raise SystemExit(f"Not a directory: {args.directory}")
+    output = args.output or os.path.join(args.directory, "skimmate_results.jsonl")
+    summary = batch.run_batch(
+        args.directory,
+        output,
+        build_keyword_map(args),
+        workers=args.workers,
+        highlight_dir=args.highlight_dir,
+        include_context=args.include_context,
+        overlay_dir=args.overlay_dir,
+        overlay_format=args.overlay_format,
+    )
+    return 1 if summary["failed"] else 0
+
+def cmd_apply_overlay(args):
+    import overlay
+    import pipeline
+    output = args.output or os.path.splitext(args.pdf)[0] + ".highlighted.pdf"
+    try:
+        highlight_overlay = overlay.load_overlay(args.overlay)
+        pipeline.apply_overlay(args.pdf, highlight_overlay, output_path=output)
+    except (OSError, ValueError) as e:
+        raise SystemExit(str(e))
+    print(f"Wrote {output}", file=sys.stderr)
+    return 0
+
+def parse_stage_thresholds(values):
+    thresholds = {}
+    for value in values or []:
+        stage, _, threshold = value.partition("=")
+        try:
+            thresholds[stage] = float(threshold)
+        except ValueError:
+            raise SystemExit(f"Invalid stage threshold: {value} (expected STAGE=FRACTION)")
+    return thresholds
+
+def cmd_bench(args):
+    import benchmark
+    # Defaults live in benchmark.py, which is only imported for this command
+    args.baseline = args.baseline or benchmark.DEFAULT_BASELINE
+    if args.threshold is None:
+        args.threshold = benchmark.DEFAULT_THRESHOLD
+    scenarios = args.scenarios or (benchmark.QUICK_SCENARIOS if args.quick else None)
+    results = benchmark.run_benchmarks(scenarios, repeat=args.repeat, log=sys.stderr)
+    baseline = benchmark.load_baseline(args.baseline)
+    print(benchmark.format_results(results, baseline))
+
+    if args.save_baseline:
+        benchmark.save_baseline(results, args.baseline)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    regressions = benchmark.compare(results, baseline, args.threshold, parse_stage_thresholds(args.stage_threshold))
+    for name, stage, before, after, change in regressions:
+        print(f"REGRESSION {name} {stage}: {before:.4f}s -> {after:.4f}s ({change * 100:+.0f}%)")
+    return 1 if regressions else 0
+
+def cmd_corpus(args):
+    import corpus
+    keyword_map = build_keyword_map(args)
+    try:
+        keyword_corpus, added = corpus.build_corpus(args.results, keyword_map, args.matrix)
+    except (OSError, ValueError) as e:
+        raise SystemExit(str(e))
+    print(f"{len(keyword_corpus)} papers ({added} added), {len(keyword_corpus.keywords)} keywords", file=sys.stderr)
+
+    if args.rank is None:
+        totals = keyword_corpus.keyword_totals()
+        for keyword in sorted(totals, key=totals.get, reverse=True)[:args.top]:
+            print(f"{totals[keyword]:8d}  {keyword}")
+        return 0
+
+    # A category name ranks by the roll-up of its keywords, anything else by one keyword
+    if args.rank in keyword_corpus.categories:
+        ranking = keyword_corpus.rank(category=args.rank, normalize=args.normalize, top=args.top)
+    elif args.rank.lower() in keyword_corpus.keywords:
+        ranking = keyword_corpus.rank(keyword=args.rank.lower(), normalize=args.normalize, top=args.top)
+    else:
+        raise SystemExit(f"Not a keyword or category: {args.rank}")
+    for paper, score in ranking:
+        print(f"{score:10.4g}  {paper}")
+    return 0
+
+def cmd_serve(args):
+    import service
+    service.serve(args.host, args.port, workers=args.workers, max_queued=args.queue, max_connections=args.max_connections)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="skimmate", description="Headless SkimMate research paper analysis.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch_parser = commands.add_parser("batch", help="analyze every PDF in a directory")
+    batch_parser.add_argument("directory", help="directory to scan for PDFs (recursively)")
+    batch_parser.add_argument("-o", "--output", help="results JSONL file (default: <directory>/skimmate_results.jsonl); "
+                                                     "papers already in it are skipped")
+    batch_parser.add_argument("-j", "--workers", type=int, help="worker processes (default: one per core)")
+    batch_parser.add_argument("--highlight-dir", help="also write highlighted PDFs to this directory")
+    batch_parser.add_argument("--include-context", action="store_true", help="include every matched sentence in the results")
+    batch_parser.add_argument("--overlay-dir", help="also write highlight overlays (a few KB per paper) to this directory")
+    batch_parser.add_argument("--overlay-format", choices=["json", "xfdf"], default="json",
+                              help="overlay file format; only JSON can be applied with apply-overlay (default: %(default)s)")
+    add_keyword_arguments(batch_parser)
+    batch_parser.set_defaults(func=cmd_batch)
+
+    apply_parser = commands.add_parser("apply-overlay", help="highlight a PDF from an overlay written by batch --overlay-dir")
+    apply_parser.add_argument("pdf", help="the original PDF the overlay was made from")
+    apply_parser.add_argument("overlay", help="JSON overlay file")
+    apply_parser.add_argument("-o", "--output", help="highlighted PDF to write (default: <pdf>.highlighted.pdf)")
+    apply_parser.set_defaults(func=cmd_apply_overlay)
+
+    bench_parser = commands.add_parser("bench", help="time every stage on a synthetic corpus and compare to a baseline")
+    bench_parser.add_argument("--baseline", help="baseline JSON file (default: benchmark_baseline.json)")
+    bench_parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    bench_parser.add_argument("--threshold", type=float,
+                              help="allowed slowdown as a fraction of the baseline (default: 0.25)")
+    bench_parser.add_argument("--stage-threshold", action="append", metavar="STAGE=FRACTION",
+                              help="override the threshold for one stage, e.g. highlight_pdf=0.5")
+    bench_parser.add_argument("--repeat", type=int, default=3, help="runs per scenario; the median is reported (default: %(default)s)")
+    bench_parser.add_argument("--quick", action="store_true", help="only run the small scenarios")
+    bench_parser.add_argument("--scenarios", nargs="+", metavar="NAME", help="only run these scenarios")
+    bench_parser.set_defaults(func=cmd_bench)
+
+    corpus_parser = commands.add_parser("corpus", help="compare papers of a batch results file by keyword counts")
+    corpus_parser.add_argument("results", help="results JSONL file written by the batch command")
+    corpus_parser.add_argument("--matrix", help="keyword matrix file (.npz) to load and extend with new papers")
+    corpus_parser.add_argument("--rank", metavar="KEYWORD_OR_CATEGORY",
+                               help="list the papers that mention a keyword or category most (default: corpus-wide keyword totals)")
+    corpus_parser.add_argument("--normalize", choices=["share", "tfidf"],
+                               help="rank by share of each paper's matches or by tf-idf instead of raw counts")
+    corpus_parser.add_argument("--top", type=int, default=20, help="rows to print (default: %(default)s)")
+    add_keyword_arguments(corpus_parser)
+    corpus_parser.set_defaults(func=cmd_corpus)
+
+    serve_parser = commands.add_parser("serve", help="run the HTTP analysis service for programmatic clients")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    serve_parser.add_argument("--port", type=int, default=8765, help="port to listen on (default: %(default)s)")
+    serve_parser.add_argument("-j", "--workers", type=int, help="analyses run at once (default: SKIMMATE_JOB_WORKERS or 2)")
+    serve_parser.add_argument("--queue", type=int, help="analyses allowed to wait before clients get 503 (default: SKIMMATE_JOB_QUEUE or 16)")
+    serve_parser.add_argument("--max-connections", type=int, help="connections served at once (default: SKIMMATE_MAX_CONNECTIONS or 64)")
+    serve_parser.set_defaults(func=cmd_serve)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
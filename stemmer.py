@@ -0,0 +1,86 @@
+import re
+from functools import lru_cache
+
+# A small, dictionary-free suffix stripper for English inflections. It only
+# has to map the forms of one word to the same key ("verify", "verifies",
+# "verified" -> "verifi"), not produce real words, and it leaves derivations
+# ("verification") alone so that keywords keep their meaning.
+VOWEL = re.compile(r"[aeiouy]")
+VOWEL_GROUP = re.compile(r"[aeiouy]+")
+# Final letters that are not undoubled after stripping "-ed"/"-ing" ("miss", "fall", "buzz");
+# a final "ll" after more than one syllable is undoubled separately ("modelling" -> "model")
+KEEP_DOUBLE = frozenset("lsz")
+# Nouns whose "-ing" is not an inflection: stripping it would match the verb
+# ("findings indicate" is not "find indicate"), so only a plural "-s" goes
+ING_NOUNS = frozenset({
+    "building", "ceiling", "earning", "evening", "finding", "funding", "heading", "holding",
+    "meaning", "morning", "proceeding", "saving", "setting", "surrounding", "training", "warning",
+})
+# Words whose "-ed" is part of the word ("embed", not "emb" + "-ed")
+ED_ROOTS = frozenset({"embed", "hundred", "infrared", "kindred", "naked", "sacred", "shred", "wicked"})
+# Singulars ending in "s", which only lose a plural "-es" ("biases" -> "bias")
+S_SINGULARS = frozenset({"alias", "atlas", "bias", "canvas", "gas", "lens"})
+
+@lru_cache(maxsize=65536)
+def stem(word):
+    """
+    Returns the stem of a lowercase word, e.g.
+    "models" -> "model", "challenging"/"challenges" -> "challeng",
+    "discrepancies" -> "discrepanci", "proposed" -> "propos",
+    "modelled" -> "model", "agreed" -> "agre", "used" -> "use",
+    "findings" -> "finding" (see ING_NOUNS).
+    """
+    if len(word) <= 3 or not word.isalpha():
+        return word
+
+    if word in S_SINGULARS:
+        return word
+    if word.endswith("es") and word[:-2] in S_SINGULARS:
+        return word[:-2]
+    if word.endswith("ies") or word.endswith("ied"):
+        word = word[:-3] + "i"
+    elif word.endswith("sses"):
+        word = word[:-2]
+    elif word.endswith(("ches", "shes", "xes", "zes")):
+        word = word[:-2]
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+
+    if word in ING_NOUNS or word in ED_ROOTS:
+        return word
+    # "proposed" -> "propos", "modeling" -> "model"
+    if word.endswith("ed") and not word.endswith("eed") and VOWEL.search(word, 0, len(word) - 2):
+        word = _restore(word[:-2])
+    elif word.endswith("ing") and VOWEL.search(word, 0, len(word) - 3):
+        word = _restore(word[:-3])
+    # "agreed" -> "agree", "exceeding" -> "exceed" -> "excee"; "need" and "seed" keep their "-eed"
+    if word.endswith("eed") and VOWEL.search(word, 0, len(word) - 3):
+        word = word[:-1]
+    # "modell" -> "model", "installs" -> "instal" as for "installed"; "fall" and "spell" keep theirs
+    if word.endswith("ll") and len(VOWEL_GROUP.findall(word)) > 1:
+        word = word[:-1]
+
+    # "validate"/"validated"/"validates" -> "validat"
+    if word.endswith("e") and len(word) > 3:
+        word = word[:-1]
+    # "verify" -> "verifi", to meet "verifies" -> "verifi"
+    if word.endswith("y") and len(word) > 3:
+        word = word[:-1] + "i"
+    return word
+
+@lru_cache(maxsize=65536)
+def stem_token(token):
+    """Stems a word as found in the text (any case); cached per spelling."""
+    return stem(token.lower())
+
+def _restore(word):
+    # "used"/"using" -> "us" -> "use", since "use" is too short to lose its "e"
+    if len(word) == 2 and word[0] in "aeiou" and word[1] not in "aeiouy":
+        return word + "e"
+    return _undouble(word)
+
+def _undouble(word):
+    # "stopped" -> "stopp" -> "stop"; three letters are a word of their own ("added" -> "add")
+    if len(word) > 3 and word[-1] == word[-2] and word[-1] not in KEEP_DOUBLE and word[-1] not in "aeiou":
+        return word[:-1]
+    return word
@@ -0,0 +1,58 @@
+import io
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import batch
+from corpus import KeywordCorpus
+from utils import get_flattened_keywords
+
+KEYWORDS = get_flattened_keywords(["Methodology"], [])
+
+class KillingPool(ProcessPoolExecutor):
+    """Kills its worker right before b.pdf is submitted, i.e. after the last results were collected."""
+    killed = False
+
+    def submit(self, fn, directory, name, *args):
+        if name == "b.pdf" and not KillingPool.killed:
+            KillingPool.killed = True
+            for process in list(self._processes.values()):
+                process.kill()
+                process.join()
+            deadline = time.monotonic() + 10
+            while not self._broken and time.monotonic() < deadline:
+                time.sleep(0.01)
+        return super().submit(fn, directory, name, *args)
+
+def test_worker_killed_before_a_submit(tmp_path, paper_pdf, monkeypatch):
+    papers = tmp_path / "papers"
+    papers.mkdir()
+    for name in ("a.pdf", "b.pdf", "c.pdf"):
+        (papers / name).write_bytes(paper_pdf)
+    output = tmp_path / "results.jsonl"
+    monkeypatch.setattr(batch, "ProcessPoolExecutor", KillingPool)
+
+    log = io.StringIO()
+    summary = batch.run_batch(str(papers), str(output), KEYWORDS, workers=1, log=log)
+
+    records = {record["file"]: record for record in map(json.loads, output.read_text().splitlines())}
+    assert KillingPool.killed
+    assert "worker process died" in records["a.pdf"]["error"]
+    # b.pdf is queued again on the new pool instead of aborting the run
+    assert "error" not in records["b.pdf"] and "error" not in records["c.pdf"]
+    assert (summary["processed"], summary["failed"]) == (2, 1)
+    assert "restarted the pool" in log.getvalue()
+    # A resumed run only retries the failed paper
+    assert batch.load_done(str(output)) == {"b.pdf", "c.pdf"}
+
+def test_results_file_readers_skip_a_partial_line(tmp_path):
+    output = tmp_path / "results.jsonl"
+    output.write_text(
+        '{"file": "a.pdf", "keyword_counts": {"model": 2}}\n'
+        '{"file": "b.pdf", "error": "FileDataError: not a PDF"}\n'
+        '{"file": "c.pdf", "keyword_coun'
+    )
+    assert [record["file"] for record in batch.read_results(str(output))] == ["a.pdf", "b.pdf"]
+    assert batch.load_done(str(output)) == {"a.pdf"}
+    corpus = KeywordCorpus(KEYWORDS)
+    assert corpus.add_results(str(output)) == 1 and corpus.papers == ["a.pdf"]
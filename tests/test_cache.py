@@ -0,0 +1,18 @@
+import triage
+from cache import cache_key, hash_pdf
+
+PDF = b"%PDF-1.4 not parsed here"
+KEYWORDS = {"model": "Methodology"}
+
+def test_precomputed_hash_gives_the_same_key():
+    assert cache_key(PDF, KEYWORDS) == cache_key(None, KEYWORDS, pdf_hash=hash_pdf(PDF))
+    assert cache_key(PDF, KEYWORDS, "highlighted") != cache_key(PDF, KEYWORDS)
+
+def test_registering_a_triage_category_changes_the_key():
+    before = cache_key(PDF, KEYWORDS)
+    triage.register_triage_category("threats_to_validity", ["confound"])
+    try:
+        assert cache_key(PDF, KEYWORDS) != before
+    finally:
+        del triage.TRIAGE_CATEGORIES["threats_to_validity"]
+    assert cache_key(PDF, KEYWORDS) == before
@@ -0,0 +1,29 @@
+from types import SimpleNamespace
+
+import pytest
+
+from citations import scan_citations
+
+def refs(text):
+    doc = SimpleNamespace(text=text, page_starts=[0])
+    return [citation["refs"] for citation in scan_citations(doc)["citations"]]
+
+@pytest.mark.parametrize("text, expected", [
+    ("As Smith (2020) showed.", [["Smith 2020"]]),
+    ("Smith et al. (2019a) and Lee and Wu (2021) disagree.", [["Smith 2019a"], ["Lee 2021"]]),
+    ("In Smith (2020), the model fails.", [["Smith 2020"]]),
+    ("Prior work (Smith and Lee, 2020; Wu et al., 2019, 2021) agrees.", [["Smith 2020", "Wu 2019", "Wu 2021"]]),
+    ("See [1-3] and [7].", [["1", "2", "3"], ["7"]]),
+])
+def test_citations_are_found(text, expected):
+    assert refs(text) == expected
+
+@pytest.mark.parametrize("text", [
+    "In (2020), the model was released.",
+    "Table (2019) lists the baselines.",
+    "The results of Figure (2021) differ.",
+    "This was first observed (In 2018, a survey found otherwise).",
+    "The range [1990-2020] is not a citation.",
+])
+def test_capitalised_words_before_a_year_are_not_authors(text):
+    assert refs(text) == []
@@ -0,0 +1,46 @@
+from highlighter import merge_highlights
+
+# Rects are (x0, y0, x1, y1) on 10 pt lines: y 0-10, 12-22, 30-40
+
+def test_touching_matches_of_a_category_merge_into_one_rect():
+    merged = merge_highlights([
+        ("model", "Methodology", [(10, 0, 40, 10)]),
+        ("models", "Methodology", [(42, 0, 80, 10)]),
+    ])
+    assert merged == [(["model", "models"], "Methodology", [(10, 0, 80, 10)])]
+
+def test_distant_matches_and_other_categories_stay_apart():
+    merged = merge_highlights([
+        ("model", "Methodology", [(10, 0, 40, 10)]),
+        ("model", "Methodology", [(100, 0, 130, 10)]),
+        ("novel", "Novelty/Contribution", [(131, 0, 160, 10)]),
+    ])
+    assert merged == [
+        (["model"], "Methodology", [(10, 0, 40, 10)]),
+        (["model"], "Methodology", [(100, 0, 130, 10)]),
+        (["novel"], "Novelty/Contribution", [(131, 0, 160, 10)]),
+    ]
+
+def test_repeated_keyword_is_listed_once():
+    merged = merge_highlights([
+        ("model", "Methodology", [(120, 30, 150, 40)]),
+        ("model", "Methodology", [(152, 30, 180, 40)]),
+    ])
+    assert merged == [(["model"], "Methodology", [(120, 30, 180, 40)])]
+
+def test_longest_match_wins_an_overlap_between_categories():
+    merged = merge_highlights([
+        ("gap", "Errors/Mistakes", [(60, 12, 75, 22)]),
+        ("novel gap", "Novelty/Contribution", [(40, 12, 75, 22)]),
+    ])
+    assert merged == [(["novel gap"], "Novelty/Contribution", [(40, 12, 75, 22)])]
+
+def test_multi_line_match_joins_a_match_on_its_next_line():
+    merged = merge_highlights([
+        ("simulation experiment", "Methodology", [(300, 0, 330, 10), (0, 12, 20, 22)]),
+        ("model", "Methodology", [(22, 12, 50, 22)]),
+    ])
+    assert merged == [(["simulation experiment", "model"], "Methodology", [(300, 0, 330, 10), (0, 12, 50, 22)])]
+
+def test_no_matches():
+    assert merge_highlights([]) == []
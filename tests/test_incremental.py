@@ -0,0 +1,72 @@
+import fitz
+import pytest
+
+import incremental
+import pipeline
+from cache import ResultCache
+from utils import CATEGORY_COLORS, DEFAULT_KEYWORDS, get_flattened_keywords
+
+CATEGORIES = list(DEFAULT_KEYWORDS)
+ALL = get_flattened_keywords(CATEGORIES, [])
+# (previous keywords, new keywords): a category off, overlapping phrases,
+# keywords sharing a stem with existing ones, a literal and a narrow set
+KEYWORD_CHANGES = [
+    (ALL, get_flattened_keywords(CATEGORIES[1:], [])),
+    (ALL, get_flattened_keywords(CATEGORIES[1:], ["simulation experiment", "model"])),
+    (ALL, get_flattened_keywords(CATEGORIES, ["verified", "n ="])),
+    (ALL, get_flattened_keywords(CATEGORIES[:2], ["earlier framework"])),
+    (get_flattened_keywords(CATEGORIES[:1], []), ALL),
+    # A phrase across the page break: pages are matched one by one, so it is never found
+    (ALL, get_flattened_keywords(CATEGORIES, ["framework and validate"])),
+]
+
+def annotations(pdf):
+    with fitz.open(stream=pdf, filetype="pdf") as doc:
+        return sorted(
+            (page.number, annot.info["content"], annot.info["subject"], tuple(round(v, 1) for v in annot.vertices[0]))
+            for page in doc
+            for annot in page.annots()
+        )
+
+@pytest.mark.parametrize("previous_map, keyword_map", KEYWORD_CHANGES)
+def test_update_result_equals_a_full_run(paper_pdf, previous_map, keyword_map):
+    previous = pipeline.run_analysis(paper_pdf, previous_map, CATEGORY_COLORS, workers=1)
+    updated, _, _ = incremental.update_result(previous, previous_map, keyword_map)
+    full = pipeline.run_analysis(paper_pdf, keyword_map, CATEGORY_COLORS, workers=1)
+
+    assert dict(updated["stats"]) == dict(full["stats"])
+    assert dict(updated["keyword_counts"]) == dict(full["keyword_counts"])
+    assert updated["keyword_forms"] == full["keyword_forms"]
+    assert updated["context_data"] == full["context_data"]
+    assert [row.snippet for row in updated["context_data"]] == [row.snippet for row in full["context_data"]]
+    assert updated["triage_data"] == full["triage_data"]
+
+@pytest.mark.parametrize("previous_map, keyword_map", KEYWORD_CHANGES)
+def test_updated_highlights_equal_a_full_run(paper_pdf, tmp_path, monkeypatch, previous_map, keyword_map):
+    cache = ResultCache(cache_dir=str(tmp_path))
+    pipeline.run_analysis(paper_pdf, previous_map, CATEGORY_COLORS, cache=cache, workers=1)
+    pipeline.highlight_document(paper_pdf, previous_map, CATEGORY_COLORS, cache=cache)
+    pipeline.run_analysis(paper_pdf, keyword_map, CATEGORY_COLORS, cache=cache, workers=1)
+
+    # The PDF must come from updating the previous one, not from highlighting again
+    updates = []
+    update_highlighted = pipeline._update_highlighted
+
+    def record_update(*args):
+        updates.append(update_highlighted(*args))
+        return updates[-1]
+
+    monkeypatch.setattr(pipeline, "_update_highlighted", record_update)
+    updated = pipeline.highlight_document(paper_pdf, keyword_map, CATEGORY_COLORS, cache=cache)
+    assert len(updates) == 1 and updates[0] == updated
+
+    assert annotations(updated) == annotations(pipeline.highlight_document(paper_pdf, keyword_map, CATEGORY_COLORS))
+
+def test_phrase_across_the_page_break_is_not_matched(paper_pdf):
+    # "...a second framework and" ends page 1, "validate it..." starts page 2
+    phrase_map = get_flattened_keywords(CATEGORIES, ["framework and validate"])
+    previous = pipeline.run_analysis(paper_pdf, ALL, CATEGORY_COLORS, workers=1)
+    updated, _, sentence_ids = incremental.update_result(previous, ALL, phrase_map)
+    search_index = updated["search_index"]
+    assert any("framework and\nvalidate" in search_index.sentence(i) for i in sentence_ids)
+    assert "framework and validate" not in updated["keyword_counts"]
@@ -0,0 +1,18 @@
+from matcher import KeywordMatcher
+
+def keywords(keyword_map, text):
+    return [(text[start:end], kw, category) for start, end, kw, category in KeywordMatcher(keyword_map).finditer(text)]
+
+def test_spellings_of_one_category_share_a_concept():
+    found = keywords({"verify": "Analysis/Results", "verified": "Analysis/Results"}, "We verified it.")
+    assert found == [("verified", "verify", "Analysis/Results")]
+
+def test_custom_keyword_sharing_a_default_stem_keeps_its_own_concept():
+    keyword_map = {"model": "Methodology", "models": "Custom"}
+    found = keywords(keyword_map, "Two models and a modelling step.")
+    assert found == [("models", "models", "Custom"), ("modelling", "models", "Custom")]
+
+def test_longest_phrase_wins():
+    keyword_map = {"simulation": "Methodology", "simulation experiment": "Methodology"}
+    found = keywords(keyword_map, "A simulation\nexperiment and a simulation.")
+    assert found == [("simulation\nexperiment", "simulation experiment", "Methodology"), ("simulation", "simulation", "Methodology")]
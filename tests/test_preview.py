@@ -0,0 +1,10 @@
+from preview import PageRenderCache
+
+def test_page_counts_are_bounded_like_the_images(paper_pdf):
+    cache = PageRenderCache(max_pages=2)
+    for doc_id in ("a", "b", "c"):
+        assert cache.page_count(doc_id, paper_pdf) == 2
+    assert list(cache._page_counts) == ["b", "c"]
+    cache.page_count("b", paper_pdf)
+    cache.page_count("d", paper_pdf)
+    assert list(cache._page_counts) == ["b", "d"]
@@ -0,0 +1,34 @@
+from segmenter import Segmenter, clean_page_text
+
+def sentences(text, spans):
+    return [(page, text[start:end]) for page, start, end in spans]
+
+def test_sentence_continues_across_a_page_break():
+    pages = [clean_page_text("First sentence. The second one starts here"), clean_page_text("and ends here. Third.")]
+    segmenter = Segmenter()
+    first = segmenter.add_page(0, pages[0])
+    second = segmenter.add_page(1, pages[1])
+    text = "".join(pages)
+
+    assert sentences(text, first) == [(0, "First sentence.")]
+    # Listed on the page it ends on, attributed to the page it starts on
+    assert sentences(text, second) == [(0, "The second one starts here\nand ends here."), (1, "Third.")]
+    assert segmenter.finish() == []
+
+def test_sentence_ending_with_the_page_is_closed_there():
+    segmenter = Segmenter()
+    pages = [clean_page_text("One sentence (closed)."), clean_page_text("Next page.")]
+    assert sentences(pages[0], segmenter.add_page(0, pages[0])) == [(0, "One sentence (closed).")]
+    assert sentences("".join(pages), segmenter.add_page(1, pages[1])) == [(1, "Next page.")]
+
+def test_unfinished_last_sentence_is_closed_by_finish():
+    segmenter = Segmenter()
+    pages = [clean_page_text("Done. Left open at"), clean_page_text("the very end")]
+    assert len(segmenter.add_page(0, pages[0])) == 1
+    assert segmenter.add_page(1, pages[1]) == []
+    assert sentences("".join(pages), segmenter.finish()) == [(0, "Left open at\nthe very end")]
+
+def test_abbreviations_and_hyphenation():
+    text = clean_page_text("Tools, e.g. the implemen-\ntation by Dr. Smith, work. Yes.")
+    spans = Segmenter().add_page(0, text)
+    assert sentences(text, spans) == [(0, "Tools, e.g. the implementation by Dr. Smith, work."), (0, "Yes.")]
@@ -0,0 +1,60 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+import jobs
+import service
+from cache import ResultCache
+
+@pytest.fixture
+def server(tmp_path):
+    manager = jobs.JobManager(cache=ResultCache(cache_dir=str(tmp_path)), max_workers=1)
+    httpd = service.AnalysisService(("127.0.0.1", 0), manager)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def request(connection, method, path, body=None):
+    connection.request(method, path, body=body)
+    response = connection.getresponse()
+    return response, response.read()
+
+def test_second_request_after_an_error_with_an_unread_body(server):
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+    # Rejected before the body is read, so the server must close the connection
+    response, _ = request(connection, "POST", "/analyze?categories=Unknown", b"%PDF-1.4 " * 100)
+    assert response.status == 400
+    assert response.getheader("Connection") == "close"
+    # The client opens a new connection instead of writing to the closed one
+    response, body = request(connection, "GET", "/health")
+    assert response.status == 200
+    assert json.loads(body)["workers"] == 1
+
+def test_keep_alive_after_a_complete_request(server, paper_pdf):
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=60)
+    response, body = request(connection, "POST", "/analyze", paper_pdf)
+    assert response.status == 200 and json.loads(body)["matches"] > 0
+    assert response.getheader("Connection") is None
+    sock = connection.sock
+    response, _ = request(connection, "GET", "/health")
+    assert response.status == 200
+    assert connection.sock is sock
+
+def test_failed_analyses_are_422_only_for_bodies_that_are_not_pdfs(server, paper_pdf, monkeypatch):
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=60)
+    response, body = request(connection, "POST", "/analyze", b"this is not a pdf")
+    assert response.status == 422
+    assert json.loads(body)["error"] == jobs.NOT_A_PDF
+
+    def fail(*args, **kwargs):
+        raise MemoryError("out of memory")
+        yield
+
+    monkeypatch.setattr(service.pipeline, "iter_analysis", fail)
+    response, body = request(connection, "POST", "/analyze?keywords=unseen", paper_pdf)
+    assert response.status == 500
+    assert json.loads(body)["error"] == "MemoryError: out of memory"
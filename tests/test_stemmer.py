@@ -0,0 +1,47 @@
+from stemmer import ING_NOUNS, stem
+from utils import DEFAULT_KEYWORDS
+
+# Common verbs of academic prose that are not keywords themselves; a keyword
+# stemming onto one of them would match every sentence using the verb
+COMMON_VERBS = (
+    "analyze", "assume", "base", "become", "begin", "build", "change", "compare", "consider", "continue",
+    "describe", "estimate", "even", "expect", "find", "follow", "fund", "give", "hold", "include",
+    "increase", "indicate", "lead", "learn", "make", "mean", "measure", "need", "observe", "obtain",
+    "proceed", "provide", "reduce", "remain", "save", "see", "seem", "set", "show", "start",
+    "take", "test", "train", "use", "warn", "work",
+)
+
+def test_default_keywords_do_not_stem_to_common_verbs():
+    verb_stems = {stem(verb): verb for verb in COMMON_VERBS}
+    clashes = [
+        (keyword, word, verb_stems[stem(word)])
+        for keywords in DEFAULT_KEYWORDS.values()
+        for keyword in keywords
+        for word in keyword.lower().split()
+        if stem(word) in verb_stems
+    ]
+    assert clashes == []
+
+def test_ing_nouns_keep_their_suffix():
+    assert stem("findings") == stem("finding") != stem("find")
+    assert stem("settings") == stem("setting") != stem("set")
+    assert stem("training") != stem("trained")
+    for noun in ING_NOUNS:
+        assert stem(noun + "s") == stem(noun) == noun
+
+def test_inflections_share_a_stem():
+    assert stem("models") == stem("modeling") == stem("model")
+    assert stem("verifies") == stem("verified") == stem("verify")
+    assert stem("challenging") == stem("challenges") == stem("challenge")
+    assert stem("verification") != stem("verify")
+
+def test_inflection_pairs_share_a_stem():
+    pairs = [
+        ("model", "modelling"), ("model", "modelled"), ("label", "labelled"),
+        ("bias", "biases"), ("bias", "biased"),
+        ("use", "used"), ("use", "using"),
+        ("agree", "agreed"), ("agree", "agreeing"),
+        ("embed", "embedded"), ("embed", "embeds"),
+        ("add", "added"), ("fall", "falling"), ("need", "needed"),
+    ]
+    assert [(a, b) for a, b in pairs if stem(a) != stem(b)] == []
@@ -0,0 +1,93 @@
+import heapq
+
+from matcher import get_matcher, group_matches_by_sentence
+
+# Triage categories: key -> heuristic keywords. Every category is scored in
+# the same pass over the document, so adding one does not add another scan.
+# Inflections ("limitations", "suggests") are found by the stemming matcher.
+TRIAGE_CATEGORIES = {
+    "research_gap": [
+        "limitation", "gap", "however", "although", "future work",
+        "remains to be", "insufficient", "lack of"
+    ],
+    "dataset_used": [
+        "dataset", "survey", "participant", "sample size", "n =",
+        "collected from", "database", "corpus", "corpora"
+    ],
+    "main_conclusion": [
+        "conclude", "conclusion", "results show", "findings indicate",
+        "summary", "demonstrate", "suggest"
+    ],
+}
+
+DEFAULT_TOP_K = 3
+# Sentences outside this length range are too short or too long to be useful
+MIN_SENTENCE_LENGTH = 20
+MAX_SENTENCE_LENGTH = 500
+
+def register_triage_category(key, keywords):
+    """
+    Adds (or replaces) a triage category, e.g.
+    register_triage_category("threats_to_validity", ["threats to validity", "confound"]).
+    """
+    TRIAGE_CATEGORIES[key] = list(keywords)
+
+def build_triage_map(categories):
+    """Maps each lowercased keyword to the tuple of categories it scores for."""
+    keyword_categories = {}
+    for key, keywords in categories.items():
+        for kw in keywords:
+            owners = keyword_categories.setdefault(kw.lower(), [])
+            if key not in owners:
+                owners.append(key)
+    return {kw: tuple(owners) for kw, owners in keyword_categories.items()}
+
+def rank_sentences(doc, top_k=DEFAULT_TOP_K, categories=None):
+    """
+    Scores every sentence of a ParsedDocument against all triage categories
+    in a single matcher pass per page. A sentence scores one point per
+    distinct keyword of a category it contains.
+    Returns:
+        - dict {category: [{"sentence", "score", "page"}, ...]} with at most
+          top_k candidates per category, best first (earlier sentences win ties)
+    """
+    categories = TRIAGE_CATEGORIES if categories is None else categories
+    matcher = get_matcher(build_triage_map(categories))
+    # One bounded min-heap per category of (score, -order, span)
+    heaps = {key: [] for key in categories}
+    order = 0
+
+    carry = []
+    for page_num in range(doc.page_count):
+        text, spans = doc.load_page(page_num)
+        matches = carry + doc.to_document_offsets(page_num, matcher.find_all(text))
+        groups, carry = group_matches_by_sentence(matches, spans)
+        for span, sentence_matches in groups:
+            order += 1
+            if not MIN_SENTENCE_LENGTH <= span[2] - span[1] <= MAX_SENTENCE_LENGTH:
+                continue
+
+            scores = {}
+            seen = set()
+            for _, _, kw, owners in sentence_matches:
+                if kw in seen:
+                    continue
+                seen.add(kw)
+                for key in owners:
+                    scores[key] = scores.get(key, 0) + 1
+
+            for key, score in scores.items():
+                entry = (score, -order, span)
+                heap = heaps[key]
+                if len(heap) < top_k:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+
+    ranked = {}
+    for key, heap in heaps.items():
+        ranked[key] = [
+            {"sentence": doc.sentence_text(span), "score": score, "page": span[0] + 1}
+            for score, _, span in sorted(heap, reverse=True)
+        ]
+    return ranked
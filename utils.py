@@ -1,31 +1,32 @@
-import streamlit as st
-
 # Default Keyword Categories and Colors
+# One spelling per concept: the keyword matcher reduces words to stems, so
+# "model" also finds "models" and "verify" finds "verifies" and "verified".
+# Derived words with their own meaning ("verification") are listed separately.
 DEFAULT_KEYWORDS = {
     "Errors/Mistakes": [
-        "problem", "problems", "error", "errors", "mistakes", "contradict", "contradicts", "contradicted", "contradictory",
-        "challenge", "challenges", "challenging", "erroneous", "deficit", "deficits", "limitation", "limitations", 
-        "gap", "gaps", "discrepancy", "discrepancies", "anomaly", "anomalies", "complexity", "complexities", 
+        "problem", "error", "mistake", "contradict", "contradictory",
+        "challenge", "erroneous", "deficit", "limitation",
+        "gap", "discrepancy", "anomaly", "complexity",
         "contrast", "sharp contrast"
     ],
     "Novelty/Contribution": [
-        "discover", "discovers", "discovered", "discovery", "discoveries", "finding", "findings", "novel", "novelty",
-        "contribute", "contributes", "contributed", "contribution", "contributions", "propose", "proposes", "proposed",
-        "insight", "insights", "outperform", "outperforms", "outperformed", "highlight", "highlights", "highlighted"
+        "discover", "discovery", "finding", "novel", "novelty",
+        "contribute", "contribution", "propose",
+        "insight", "outperform", "highlight"
     ],
     "Methodology": [
-        "methodology", "methodologies", "algorithm", "algorithms", "framework", "frameworks", "model", "models",
-        "implement", "implements", "implemented", "implementation", "application", "applications", "experiment", "experiments",
-        "simulation", "simulation experiment", "survey", "surveys", "interview", "interviews", "data collection", 
-        "primary data", "qualitative", "quantitative", "KPI", "performance evaluation", "observation", "observations",
+        "methodology", "algorithm", "framework", "model",
+        "implement", "implementation", "application", "experiment",
+        "simulation", "simulation experiment", "survey", "interview", "data collection", 
+        "primary data", "qualitative", "quantitative", "KPI", "performance evaluation", "observation",
         "pragmatic", "heuristic"
     ],
     "Analysis/Results": [
-        "verify", "verifies", "verified", "verification", "justify", "justifies", "justified", "justification",
-        "evident", "evidence", "results", "validate", "validates", "validated", "validation", "performance", 
-        "performs", "performed", "evaluation", "argument", "arguments", "argues", "argued", "suggest", "suggests", 
-        "suggested", "implication", "implications", "hypothesis", "hypotheses", "confirmation", "clarifies", 
-        "clarification", "argumentative", "report", "reports", "reported", "aim", "aims", "goals", "outcome", "outcomes"
+        "verify", "verification", "justify", "justification",
+        "evident", "evidence", "result", "validate", "validation", "performance", 
+        "perform", "evaluation", "argument", "argue", "suggest",
+        "implication", "hypothesis", "hypotheses", "confirmation", "clarify", 
+        "clarification", "argumentative", "report", "aim", "goal", "outcome"
     ]
 }
 